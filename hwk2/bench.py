@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Benchmark the hw2 pipeline stage by stage on generated corpora.
+
+Each corpus size runs in its own subprocess so peak RSS is measured per size.
+Results are written as JSON so runs from different versions can be compared.
+"""
+import argparse
+import importlib.util
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+import hw2
+
+
+# generate-content.py is not importable by name because of the hyphen.
+_spec = importlib.util.spec_from_file_location("generate_content", Path(__file__).with_name("generate-content.py"))
+generate_content = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(generate_content)
+
+
+def generate_pages(num_files: int, max_refs: int, seed: int = 0):
+    """Yield ``(page_id, html_bytes)`` for a synthetic corpus, as ``generate-content.py -j`` writes it."""
+    for page_id in range(num_files):
+        links = generate_content.page_links(page_id, max_refs, num_files, seed)
+        yield page_id, generate_content.render_page(links).encode()
+
+
+def peak_rss_bytes() -> int:
+    """Peak RSS of this process plus its (already reaped) children."""
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * scale
+
+
+class StageTimer:
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {}
+
+    def time(self, name: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.seconds[name] = time.perf_counter() - start
+        return result
+
+
+def bench_one(num_files: int, max_refs: int, in_memory: bool, ingest_mode: str, workers: int | None, solver: str) -> dict:
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory(prefix="hw2-bench-") as tmp:
+        start = time.perf_counter()
+        if in_memory:
+            pages = list(generate_pages(num_files, max_refs))
+        else:
+            for page_id, html in generate_pages(num_files, max_refs):
+                Path(tmp, f"{page_id}.html").write_bytes(html)
+        generate_seconds = time.perf_counter() - start
+
+        if in_memory:
+
+            def parse() -> hw2.LinkTable:
+                scanner = hw2.LinkScanner()
+                counts = np.fromiter((scanner.scan(html) for _, html in pages), dtype=np.int64, count=len(pages))
+                return hw2.LinkTable.from_counts(np.arange(num_files), counts, scanner.take())
+
+            table = timer.time("parse", parse)
+        else:
+            html_paths = sorted(Path(tmp).glob("*.html"))
+            table = timer.time("parse", hw2.ingest_table, html_paths, mode=ingest_mode, workers=workers)
+
+    graph = timer.time("build_graph", hw2.CSRGraph.from_links, table)
+
+    def stats() -> None:
+        out_deg, in_deg = graph.degrees()
+        hw2.degree_stats(out_deg)
+        hw2.degree_stats(in_deg)
+
+    timer.time("degree_stats", stats)
+    result = timer.time("pagerank", hw2.pagerank_csr, graph, solver=solver)
+    return {
+        "pages": num_files,
+        "edges": graph.num_edges,
+        "graph_bytes": graph.nbytes,
+        "max_refs": max_refs,
+        "in_memory": in_memory,
+        "ingest": "in-memory" if in_memory else ingest_mode,
+        "solver": solver,
+        "generate_seconds": generate_seconds,
+        "stages": timer.seconds,
+        "pagerank_iterations": result.iterations,
+        "pagerank_residual": result.residual,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-refs", type=int, default=20, help="Maximum links per page (generate-content.py uses 250)")
+    parser.add_argument("--in-memory", action="store_true", help="Parse generated bytes directly instead of files on disk")
+    parser.add_argument("--ingest", choices=hw2.INGEST_MODES, default="process")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--solver", choices=hw2.PAGERANK_SOLVERS, default="power")
+    parser.add_argument("--output", type=Path, default=Path("bench.json"))
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = bench_one(args.sizes[0], args.max_refs, args.in_memory, args.ingest, args.workers, args.solver)
+        args.output.write_text(json.dumps(result))
+        return
+
+    runs = []
+    for size in args.sizes:
+        print(f"Benchmarking {size} pages (max_refs={args.max_refs})...")
+        with tempfile.NamedTemporaryFile(suffix=".json") as out:
+            cmd = [
+                sys.executable, __file__, "--single",
+                "--sizes", str(size),
+                "--max-refs", str(args.max_refs),
+                "--ingest", args.ingest,
+                "--solver", args.solver,
+                "--output", out.name,
+            ]
+            if args.in_memory:
+                cmd.append("--in-memory")
+            if args.workers:
+                cmd += ["--workers", str(args.workers)]
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+            run = json.loads(Path(out.name).read_text())
+        runs.append(run)
+        stages = "  ".join(f"{name}={sec:.3f}s" for name, sec in run["stages"].items())
+        print(f"  {stages}  peak_rss={run['peak_rss_bytes'] / 2**20:.1f}MiB")
+
+    report = {
+        "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "runs": runs,
+    }
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
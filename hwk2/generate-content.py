@@ -1,6 +1,10 @@
 #!env python3
 import argparse
+import io
+import os
 import random
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
 
 def add_text(f):
   text = "Lorem ipsum dolor sit amet, \
@@ -50,14 +54,92 @@ def generate_file(idx, max_refs, num_files):
     add_footers(f)
     f.close()
 
+# Pages per task handed to a worker process
+CHUNK = 1000
+
+def page_links(idx, max_refs, num_files, seed):
+  # seeded per file, so output does not depend on the number of workers or the order they run in
+  rng = random.Random(seed * 2**32 + idx)
+  return [rng.randrange(0, num_files) for _ in range(rng.randrange(0, max_refs))]
+
+def render_page(links):
+  # same helpers as generate_file, writing into one buffer instead of the file
+  buf = io.StringIO()
+  add_headers(buf)
+  for lnk in links:
+    add_text(buf)
+    add_link(buf, lnk)
+  add_footers(buf)
+  return buf.getvalue()
+
+def write_pages(out_dir, start, end, max_refs, num_files, seed):
+  for idx in range(start, end):
+    data = render_page(page_links(idx, max_refs, num_files, seed)).encode("utf-8")
+    with open(os.path.join(out_dir, str(idx) + ".html"), 'wb') as f:
+      f.write(data)
+  return end - start
+
+def write_tar_shard(path, start, end, max_refs, num_files, seed):
+  with tarfile.open(path, 'w') as tar:
+    for idx in range(start, end):
+      data = render_page(page_links(idx, max_refs, num_files, seed)).encode("utf-8")
+      info = tarfile.TarInfo(str(idx) + ".html")
+      info.size = len(data)
+      tar.addfile(info, io.BytesIO(data))
+  return end - start
+
+def edge_lines(start, end, max_refs, num_files, seed):
+  return "".join(
+    f"{idx} {lnk}\n" for idx in range(start, end) for lnk in page_links(idx, max_refs, num_files, seed)
+  )
+
+def chunks(num_files, size):
+  return [(i, min(i + size, num_files)) for i in range(0, num_files, size)]
+
+def generate_parallel(args):
+  jobs = args.jobs or os.cpu_count() or 1
+  common = (args.max_refs, args.num_files, args.seed)
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    if args.graph_only:
+      # ordered map keeps the edge list sorted by source page
+      with open(args.graph_only, 'w', encoding="utf-8") as f:
+        for text in pool.map(edge_lines, *zip(*[(a, b, *common) for a, b in chunks(args.num_files, CHUNK)])):
+          f.write(text)
+    elif args.tar:
+      if os.path.dirname(args.tar):
+        os.makedirs(os.path.dirname(args.tar), exist_ok=True)
+      shards = args.shards or jobs
+      per_shard = -(-args.num_files // shards)
+      futures = [
+        pool.submit(write_tar_shard, f"{args.tar}-{k:05d}.tar", a, b, *common)
+        for k, (a, b) in enumerate(chunks(args.num_files, per_shard))
+      ]
+      for fut in futures:
+        fut.result()
+    else:
+      os.makedirs(args.out_dir, exist_ok=True)
+      futures = [pool.submit(write_pages, args.out_dir, a, b, *common) for a, b in chunks(args.num_files, CHUNK)]
+      for fut in futures:
+        fut.result()
+
 def main():
   parser = argparse.ArgumentParser()
   parser.add_argument('-n', '--num_files', help="Specify the number of files to generate", type=int, default=10000)
   parser.add_argument('-m', '--max_refs', type=int, help="Specify the maximum number of references per file", default=250)
+  parser.add_argument('-j', '--jobs', type=int, help="Generate in parallel across this many processes, seeding each file independently")
+  parser.add_argument('-o', '--out_dir', help="Directory for the generated files (parallel mode)", default=".")
+  parser.add_argument('--tar', metavar="PREFIX", help="Write pages into PREFIX-00000.tar, PREFIX-00001.tar, ... instead of files")
+  parser.add_argument('--shards', type=int, help="Number of tar shards (default: one per job)")
+  parser.add_argument('--graph_only', metavar="PATH", help="Write only the \"src dst\" edge list to PATH, no HTML")
+  parser.add_argument('--seed', type=int, default=0)
   args = parser.parse_args()
-  random.seed(0)
 
   print(args.num_files, args.max_refs)
+  if args.jobs or args.tar or args.graph_only:
+    generate_parallel(args)
+    return
+
+  random.seed(args.seed)
   for i in range(0,args.num_files):
     generate_file(i, args.max_refs, args.num_files)
 
@@ -1,9 +1,27 @@
 #!/usr/bin/env python3
 import argparse
+import cProfile
+import io
+import json
+import mmap
+import multiprocessing
+import os
 import re
-import statistics
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from pathlib import Path
+import struct
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import chain
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path, PurePosixPath
+
+import numpy as np
 
 # Match href value (quoted or unquoted), then capture leading digits before first dot or end. Generated by AI.
 _HREF_RE = re.compile(r'href\s*=\s*["\']?([^"\'>\s]+)', re.I)
@@ -21,6 +39,487 @@ def parse_html_links(html: str) -> list[int]:
     return ids
 
 
+_INT64_MIN, _INT64_MAX = -(2**63), 2**63 - 1
+INGEST_MODES = ("process", "thread")
+
+# Bytes-level equivalent of _HREF_RE: find each "=" (rare outside attributes) and capture the
+# value up to the first dot; LinkScanner then checks that the attribute name before it is href.
+_HREF_VALUE_RE = re.compile(rb'=\s*["\']?([^"\'>\s.]*)')
+_ASCII_WHITESPACE = frozenset(b" \t\n\r\f\v")
+
+
+class LinkScanner:
+    """Extracts href link ids from raw page bytes without decoding them.
+
+    Ids are appended to a reusable int64 buffer that grows as needed; small
+    files are read into a reusable byte buffer and larger ones are mmapped.
+    """
+
+    def __init__(self, capacity: int = 4096, read_buffer_size: int = 1 << 16) -> None:
+        self.buffer = np.empty(capacity, dtype=np.int64)
+        self.count = 0
+        self._read_buffer = bytearray(read_buffer_size)
+
+    def reset(self) -> None:
+        self.count = 0
+
+    def take(self) -> np.ndarray:
+        """Return a copy of the ids scanned since the last reset, and reset."""
+        ids = self.buffer[: self.count].copy()
+        self.reset()
+        return ids
+
+    def scan(self, data) -> int:
+        """Append the link ids in ``data`` (any bytes-like object) and return how many were found."""
+        buf = self.buffer
+        n = start = self.count
+        for match in _HREF_VALUE_RE.finditer(data):
+            j = match.start()
+            while j and data[j - 1] in _ASCII_WHITESPACE:
+                j -= 1
+            if j < 4 or bytes(data[j - 4 : j]).lower() != b"href":
+                continue
+            try:
+                value = int(match.group(1))
+            except ValueError:
+                continue
+            if not _INT64_MIN <= value <= _INT64_MAX:
+                continue
+            if n == len(buf):
+                buf = self.buffer = np.resize(buf, 2 * len(buf))
+            buf[n] = value
+            n += 1
+        self.count = n
+        return n - start
+
+    def scan_file(self, path: Path) -> int:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return 0
+            if size <= len(self._read_buffer):
+                view = memoryview(self._read_buffer)[:size]
+                f.readinto(view)
+                return self.scan(view)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return self.scan(data)
+
+
+def default_workers() -> int:
+    """Number of cores this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def read_and_parse(path: Path) -> tuple[int, list[int]]:
+    scanner = LinkScanner()
+    scanner.scan_file(path)
+    return (int(path.stem), scanner.take().tolist())
+
+
+def parse_chunk(paths: list[Path]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Parse a chunk of pages in a worker process.
+
+    Returns page ids, per-page link counts and the concatenated link ids as
+    int64 arrays, which pickle far more compactly than lists of ints.
+    """
+    scanner = LinkScanner()
+    page_ids = np.empty(len(paths), dtype=np.int64)
+    counts = np.empty(len(paths), dtype=np.int64)
+    for k, path in enumerate(paths):
+        page_ids[k] = int(path.stem)
+        counts[k] = scanner.scan_file(path)
+    return page_ids, counts, scanner.take()
+
+
+def ragged_indices(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Flat indices of the segments ``[starts[i], starts[i] + counts[i])``, concatenated in order."""
+    ends = np.cumsum(counts)
+    return np.repeat(starts - (ends - counts), counts) + np.arange(ends[-1] if len(ends) else 0)
+
+
+@dataclass
+class LinkTable:
+    """Parsed out-links per page, as CSR arrays.
+
+    Page ``page_ids[i]`` links to ``targets[offsets[i]:offsets[i + 1]]``; targets
+    are raw link ids and may name pages outside the crawl.
+    """
+
+    page_ids: np.ndarray
+    offsets: np.ndarray
+    targets: np.ndarray
+
+    @classmethod
+    def from_counts(cls, page_ids: np.ndarray, counts: np.ndarray, targets: np.ndarray) -> "LinkTable":
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(np.asarray(page_ids, dtype=np.int64), offsets, np.asarray(targets, dtype=np.int64))
+
+    @classmethod
+    def from_items(cls, items: list[tuple[int, list[int]]]) -> "LinkTable":
+        return cls.from_counts(
+            np.fromiter((pid for pid, _ in items), dtype=np.int64, count=len(items)),
+            np.fromiter((len(links) for _, links in items), dtype=np.int64, count=len(items)),
+            np.fromiter(chain.from_iterable(links for _, links in items), dtype=np.int64),
+        )
+
+    @classmethod
+    def concat(cls, tables: list["LinkTable"]) -> "LinkTable":
+        """Join tables and order the result by page id."""
+        joined = cls.from_counts(
+            np.concatenate([t.page_ids for t in tables]),
+            np.concatenate([np.diff(t.offsets) for t in tables]),
+            np.concatenate([t.targets for t in tables]),
+        )
+        return joined.take(np.argsort(joined.page_ids, kind="stable"))
+
+    def __len__(self) -> int:
+        return len(self.page_ids)
+
+    def take(self, rows: np.ndarray) -> "LinkTable":
+        """Gather the given rows, in order, into a new table."""
+        starts = self.offsets[rows]
+        counts = self.offsets[rows + 1] - starts
+        return LinkTable.from_counts(self.page_ids[rows], counts, self.targets[ragged_indices(starts, counts)])
+
+    def items(self) -> list[tuple[int, list[int]]]:
+        ends = self.offsets[1:].tolist()
+        flat = self.targets.tolist()
+        items = []
+        start = 0
+        for page_id, end in zip(self.page_ids.tolist(), ends):
+            items.append((page_id, flat[start:end]))
+            start = end
+        return items
+
+
+def iter_parse_chunks(html_paths: list[Path], workers: int | None = None, chunk_size: int = 256):
+    """Yield ``parse_chunk`` results for ``html_paths`` from a process pool, in path order."""
+    chunks = [html_paths[i : i + chunk_size] for i in range(0, len(html_paths), chunk_size)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers or default_workers()) as executor:
+        for result in executor.map(parse_chunk, chunks):
+            yield result
+            if (done + len(result[0])) // 1000 > done // 1000:
+                print(f"  {done + len(result[0])}/{len(html_paths)} files")
+            done += len(result[0])
+
+
+def ingest_table(
+    html_paths: list[Path],
+    mode: str = "process",
+    workers: int | None = None,
+    chunk_size: int = 256,
+) -> LinkTable:
+    """Read and parse every page into a ``LinkTable`` ordered by page id.
+
+    "process" mode spreads chunks of ``chunk_size`` paths over a process pool so
+    regex parsing scales with cores; the chunks' arrays are joined without ever
+    becoming Python lists. "thread" mode uses a thread pool per file.
+    """
+    if mode == "process":
+        tables = [LinkTable.from_counts(*result) for result in iter_parse_chunks(html_paths, workers, chunk_size)]
+        return LinkTable.concat(tables) if tables else LinkTable.from_items([])
+    return LinkTable.from_items(ingest(html_paths, mode=mode, workers=workers))
+
+
+def ingest(
+    html_paths: list[Path],
+    mode: str = "process",
+    workers: int | None = None,
+    chunk_size: int = 256,
+) -> list[tuple[int, list[int]]]:
+    """Read and parse every page, returning ``(page_id, links)`` items sorted by page id.
+
+    See ``ingest_table`` for the modes.
+    """
+    if mode == "process":
+        return ingest_table(html_paths, mode=mode, workers=workers, chunk_size=chunk_size).items()
+
+    items = []
+    with ThreadPoolExecutor(max_workers=workers or default_workers()) as executor:
+        futures = {executor.submit(read_and_parse, p): p for p in html_paths}
+        for i, future in enumerate(as_completed(futures), 1):
+            items.append(future.result())
+            if i % 1000 == 0:
+                print(f"  {i}/{len(html_paths)} files")
+
+    # Preserve order by page_id so build_graph is deterministic
+    items.sort(key=lambda x: x[0])
+    return items
+
+
+GRAPH_CACHE_NAME = ".hw2-graph.npz"
+GRAPH_CACHE_VERSION = 1
+
+
+def fingerprint_pages(html_paths: list[Path]) -> tuple[np.ndarray, np.ndarray]:
+    """Return (mtime_ns, size) arrays used to detect modified pages."""
+    stats = [p.stat() for p in html_paths]
+    return (
+        np.fromiter((st.st_mtime_ns for st in stats), dtype=np.int64, count=len(stats)),
+        np.fromiter((st.st_size for st in stats), dtype=np.int64, count=len(stats)),
+    )
+
+
+def load_graph_cache(cache_path: Path) -> tuple[LinkTable, np.ndarray, np.ndarray] | None:
+    """Load a cached link table and its per-page fingerprints, or None if missing or unusable."""
+    try:
+        with np.load(cache_path) as data:
+            if int(data["version"]) != GRAPH_CACHE_VERSION:
+                return None
+            table = LinkTable(data["page_ids"], data["offsets"], data["targets"])
+            return table, data["mtime_ns"], data["sizes"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def save_graph_cache(cache_path: Path, table: LinkTable, mtime_ns: np.ndarray, sizes: np.ndarray) -> None:
+    """Write the cache atomically (temp file + rename) so a crash never leaves a torn cache."""
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            version=np.array(GRAPH_CACHE_VERSION),
+            page_ids=table.page_ids,
+            offsets=table.offsets,
+            targets=table.targets,
+            mtime_ns=mtime_ns,
+            sizes=sizes,
+        )
+    os.replace(tmp_path, cache_path)
+
+
+def ingest_cached(
+    html_paths: list[Path],
+    cache_path: Path,
+    mode: str = "process",
+    workers: int | None = None,
+) -> LinkTable:
+    """Like ``ingest``, but reuse links from ``cache_path`` for pages whose mtime and size are unchanged.
+
+    Only new or modified pages are parsed; removed pages are dropped. The cache
+    is rewritten whenever anything changed.
+    """
+    html_paths = sorted(html_paths, key=lambda p: int(p.stem))
+    page_ids = np.fromiter((int(p.stem) for p in html_paths), dtype=np.int64, count=len(html_paths))
+    mtime_ns, sizes = fingerprint_pages(html_paths)
+
+    reuse = np.zeros(len(html_paths), dtype=bool)
+    rows = np.zeros(len(html_paths), dtype=np.int64)
+    cached = load_graph_cache(cache_path)
+    if cached is not None:
+        table, cached_mtime, cached_sizes = cached
+        if len(table):
+            rows = np.minimum(np.searchsorted(table.page_ids, page_ids), len(table) - 1)
+            reuse = (table.page_ids[rows] == page_ids) & (cached_mtime[rows] == mtime_ns) & (cached_sizes[rows] == sizes)
+    stale = [p for p, keep in zip(html_paths, reuse.tolist()) if not keep]
+    print(f"Graph cache: {int(reuse.sum())} pages unchanged, {len(stale)} to parse")
+
+    parts = [cached[0].take(rows[reuse])] if cached is not None and reuse.any() else []
+    if stale:
+        parts.append(ingest_table(stale, mode=mode, workers=workers))
+    table = LinkTable.concat(parts) if parts else LinkTable.from_items([])
+
+    if stale or cached is None or len(cached[0]) != int(reuse.sum()):
+        try:
+            save_graph_cache(cache_path, table, mtime_ns, sizes)
+        except OSError as e:
+            print(f"Could not write graph cache {cache_path}: {e}")
+    return table
+
+
+class PageSource:
+    """A place pages can be listed and fetched from by name, e.g. a bucket prefix."""
+
+    def list_pages(self) -> list[str]:
+        raise NotImplementedError
+
+    def fetch(self, name: str) -> bytes:
+        raise NotImplementedError
+
+
+class LocalDirSource(PageSource):
+    """Serves ``*.html`` files from a local directory; stands in for a bucket in tests."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+
+    def list_pages(self) -> list[str]:
+        return sorted(p.name for p in self.root.glob("*.html"))
+
+    def fetch(self, name: str) -> bytes:
+        return (self.root / name).read_bytes()
+
+
+class GCSSource(PageSource):
+    """Lists and downloads objects under ``gs://bucket/prefix``.
+
+    Honors ``STORAGE_EMULATOR_HOST``, so a GCS emulator can stand in for the bucket.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "") -> None:
+        try:
+            from google.cloud import storage
+        except ImportError as e:
+            raise SystemExit("Streaming from GCS requires google-cloud-storage (pip install google-cloud-storage)") from e
+        self.prefix = prefix
+        self._client = storage.Client()
+        self._bucket = self._client.bucket(bucket)
+
+    def list_pages(self) -> list[str]:
+        blobs = self._client.list_blobs(self._bucket, prefix=self.prefix)
+        return [b.name for b in blobs if b.name.endswith(".html")]
+
+    def fetch(self, name: str) -> bytes:
+        return self._bucket.blob(name).download_as_bytes()
+
+
+def open_source(spec: str) -> PageSource:
+    """Build a source from ``gs://bucket/prefix`` or a local directory path."""
+    if spec.startswith("gs://"):
+        bucket, _, prefix = spec[len("gs://") :].partition("/")
+        return GCSSource(bucket, prefix)
+    return LocalDirSource(Path(spec.removeprefix("file://")))
+
+
+def stream_ingest(source: PageSource, concurrency: int = 32, max_in_flight: int | None = None) -> LinkTable:
+    """Download pages through a bounded pool of ``concurrency`` fetch threads and parse each on arrival.
+
+    At most ``max_in_flight`` downloads (default ``4 * concurrency``) are queued at
+    once, so memory stays bounded and nothing is written to disk.
+    """
+    names = source.list_pages()
+    max_in_flight = max_in_flight or 4 * concurrency
+    print(f"Found {len(names)} pages, streaming and parsing...")
+    scanner = LinkScanner()
+    page_ids: list[int] = []
+    counts: list[int] = []
+    pending = iter(names)
+    in_flight: dict = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+        def refill() -> None:
+            for name in pending:
+                in_flight[executor.submit(source.fetch, name)] = name
+                if len(in_flight) >= max_in_flight:
+                    break
+
+        refill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = in_flight.pop(future)
+                page_ids.append(int(PurePosixPath(name).stem))
+                counts.append(scanner.scan(future.result()))
+                if len(page_ids) % 1000 == 0:
+                    print(f"  {len(page_ids)}/{len(names)} files")
+            refill()
+
+    table = LinkTable.from_counts(np.array(page_ids, dtype=np.int64), np.array(counts, dtype=np.int64), scanner.take())
+    return table.take(np.argsort(table.page_ids, kind="stable"))
+
+
+SHARD_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".zip", ".pages")
+RECORD_MAGIC = b"HW2PAGES"
+_RECORD_FOOTER = struct.Struct("<qq8s")
+
+
+def find_shards(data_dir: Path) -> list[Path]:
+    return sorted(p for p in data_dir.iterdir() if p.is_file() and p.name.endswith(SHARD_SUFFIXES))
+
+
+def write_record_shard(path: Path, pages) -> int:
+    """Write ``(page_id, html_bytes)`` pairs as one indexed record file; returns the page count.
+
+    Layout: ``RECORD_MAGIC``, the page bodies back to back, an index of
+    little-endian int64 ``(page_id, offset, length)`` triples, then a footer of
+    the index offset, the page count and ``RECORD_MAGIC`` again.
+    """
+    index = []
+    with open(path, "wb") as f:
+        f.write(RECORD_MAGIC)
+        for page_id, data in pages:
+            index.append((page_id, f.tell(), len(data)))
+            f.write(data)
+        index_offset = f.tell()
+        f.write(np.array(index, dtype="<i8").reshape(-1, 3).tobytes())
+        f.write(_RECORD_FOOTER.pack(index_offset, len(index), RECORD_MAGIC))
+    return len(index)
+
+
+def iter_record_shard(path: Path):
+    """Yield ``(page_id, html_bytes)`` from a ``write_record_shard`` file in file order."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < len(RECORD_MAGIC) + _RECORD_FOOTER.size:
+            raise ValueError(f"Not a page record shard: {path}")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            index_offset, count, magic = _RECORD_FOOTER.unpack(data[-_RECORD_FOOTER.size :])
+            if data[: len(RECORD_MAGIC)] != RECORD_MAGIC or magic != RECORD_MAGIC:
+                raise ValueError(f"Not a page record shard: {path}")
+            index = np.frombuffer(data[index_offset : index_offset + 24 * count], dtype="<i8").reshape(-1, 3)
+            for page_id, offset, length in index.tolist():
+                yield page_id, data[offset : offset + length]
+
+
+def iter_shard_pages(path: Path):
+    """Yield ``(page_id, html_bytes)`` for every ``*.html`` member of a shard, reading it sequentially.
+
+    The page id comes from the member name the same way ``int(path.stem)`` does
+    for loose files, so ``web/123.html`` is page 123.
+    """
+    name = path.name
+    if name.endswith(".pages"):
+        yield from iter_record_shard(path)
+    elif name.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.endswith(".html"):
+                    yield int(PurePosixPath(info.filename).stem), zf.read(info)
+    else:
+        with tarfile.open(path, "r|*") as tar:
+            for member in tar:
+                if member.isfile() and member.name.endswith(".html"):
+                    yield int(PurePosixPath(member.name).stem), tar.extractfile(member).read()
+
+
+def parse_shard(path: Path) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Parse every page of one shard; returns arrays shaped like ``parse_chunk``'s."""
+    scanner = LinkScanner()
+    page_ids: list[int] = []
+    counts: list[int] = []
+    for page_id, data in iter_shard_pages(path):
+        page_ids.append(page_id)
+        counts.append(scanner.scan(data))
+    return np.array(page_ids, dtype=np.int64), np.array(counts, dtype=np.int64), scanner.take()
+
+
+def ingest_shards(shard_paths: list[Path], workers: int | None = None) -> LinkTable:
+    """Parse shard archives in a process pool, one whole shard per task."""
+    tables = []
+    with ProcessPoolExecutor(max_workers=workers or default_workers()) as executor:
+        for path, result in zip(shard_paths, executor.map(parse_shard, shard_paths)):
+            tables.append(LinkTable.from_counts(*result))
+            print(f"  {path.name}: {len(result[0])} pages")
+    return LinkTable.concat(tables) if tables else LinkTable.from_items([])
+
+
+def pack_records(html_paths: list[Path], prefix: str, shards: int) -> list[Path]:
+    """Pack loose ``*.html`` files into ``shards`` record files named ``PREFIX-00000.pages`` and so on."""
+    per_shard = max(-(-len(html_paths) // max(shards, 1)), 1)
+    Path(prefix).parent.mkdir(parents=True, exist_ok=True)
+    written = []
+    for k, start in enumerate(range(0, len(html_paths), per_shard)):
+        path = Path(f"{prefix}-{k:05d}.pages")
+        write_record_shard(path, ((int(p.stem), p.read_bytes()) for p in html_paths[start : start + per_shard]))
+        written.append(path)
+    return written
+
+
 def build_graph(items: list, page_ids: set):
     adjacency_list = {}
     for page_id, outgoing in items:
@@ -37,20 +536,44 @@ def build_reverse_adjacency(adjacency_list: dict, all_ids: set) -> dict[int, lis
     return rev
 
 
-def degree_stats(degree_dict: dict) -> tuple[float, float, int, int, list[float]]:
-    vals = list(degree_dict.values())
-    if not vals:
+def degree_stats(degrees: np.ndarray | dict) -> tuple[float, float, int, int, list[float]]:
+    """Mean, median, max, min and quintiles of a degree array.
+
+    Matches ``statistics.median`` and ``statistics.quantiles(n=5)`` (exclusive
+    method) exactly, but only partitions the array around the needed ranks
+    instead of sorting boxed ints.
+    """
+    if isinstance(degrees, dict):
+        degrees = np.fromiter(degrees.values(), dtype=np.int64, count=len(degrees))
+    n = len(degrees)
+    if n == 0:
         return 0.0, 0.0, 0, 0, []
+    # ranks needed for the median and for each quintile's interpolation (see statistics.quantiles)
+    quintile_ranks = []
+    for i in range(1, 5):
+        j = min(max(i * (n + 1) // 5, 1), n - 1) if n > 1 else 0
+        quintile_ranks.append((j, i * (n + 1) - j * 5))
+    kth = {(n - 1) // 2, n // 2} | {max(j - 1, 0) for j, _ in quintile_ranks} | {j for j, _ in quintile_ranks}
+    part = np.partition(degrees, sorted(kth))
+
+    def at(k: int) -> int:
+        return int(part[k])
+
+    median = at(n // 2) if n % 2 else (at(n // 2 - 1) + at(n // 2)) / 2
+    if n == 1:
+        quintiles = [float(at(0))] * 4
+    else:
+        quintiles = [(at(j - 1) * (5 - delta) + at(j) * delta) / 5 for j, delta in quintile_ranks]
     return (
-        sum(vals) / len(vals),
-        statistics.median(vals),
-        max(vals),
-        min(vals),
-        statistics.quantiles(vals, n=5),
+        int(degrees.sum()) / n,
+        median,
+        int(degrees.max()),
+        int(degrees.min()),
+        quintiles,
     )
 
 
-def print_stats(out_deg: dict, in_deg: dict) -> None:
+def print_stats(out_deg: np.ndarray | dict, in_deg: np.ndarray | dict) -> None:
     o_avg, o_med, o_max, o_min, o_quint = degree_stats(out_deg)
     i_avg, i_med, i_max, i_min, i_quint = degree_stats(in_deg)
     print("Outgoing links:")
@@ -59,45 +582,1043 @@ def print_stats(out_deg: dict, in_deg: dict) -> None:
     print(f"  avg={i_avg:.4f}  median={i_med}  max={i_max}  min={i_min}  quintiles={i_quint}")
 
 
+@dataclass
+class CSRGraph:
+    """Compact link graph over dense node indices, stored as in-edge CSR arrays.
+
+    Node ``i`` has page id ``ids[i]``; its in-neighbours are
+    ``in_indices[in_indptr[i]:in_indptr[i + 1]]``. Out-edges are derived on
+    demand by ``out_csr``. Edges cost 4 bytes per direction instead of the two
+    boxed ints per edge of the dict-of-lists graph.
+    """
+
+    ids: np.ndarray
+    in_indptr: np.ndarray
+    in_indices: np.ndarray
+    out_degree: np.ndarray
+    inv_out_degree: np.ndarray
+    _out_csr: tuple[np.ndarray, np.ndarray] | None = field(default=None, repr=False)
+    _id_sorter: np.ndarray | None = field(default=None, repr=False)
+
+    @classmethod
+    def from_adjacency(cls, adjacency_list: dict, reverse_adjacency: dict, all_ids: set) -> "CSRGraph":
+        ids = np.array(sorted(all_ids), dtype=np.int64)
+        id_list = ids.tolist()
+        n = len(id_list)
+        in_counts = np.fromiter((len(reverse_adjacency.get(i, ())) for i in id_list), dtype=np.int64, count=n)
+        in_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(in_counts, out=in_indptr[1:])
+        sources = np.fromiter(
+            chain.from_iterable(reverse_adjacency.get(i, ()) for i in id_list),
+            dtype=np.int64,
+            count=int(in_indptr[-1]),
+        )
+        out_degree = np.fromiter((len(adjacency_list.get(i, ())) for i in id_list), dtype=np.int64, count=n)
+        return cls(
+            ids=ids,
+            in_indptr=in_indptr,
+            in_indices=np.searchsorted(ids, sources).astype(np.int32),
+            out_degree=out_degree,
+            inv_out_degree=1.0 / np.maximum(out_degree, 1),
+        )
+
+    @classmethod
+    def from_links(cls, table: LinkTable, page_ids: np.ndarray | None = None) -> "CSRGraph":
+        """Build the graph straight from parsed link arrays, keeping only links between known pages.
+
+        Nodes are ``page_ids`` (default: the table's pages); if a page appears
+        in the table more than once its last row wins, as in ``build_graph``.
+        """
+        ids = np.unique(table.page_ids if page_ids is None else np.asarray(page_ids, dtype=np.int64))
+        n = len(ids)
+        last = len(table) - 1 - np.unique(table.page_ids[::-1], return_index=True)[1]
+        rows = last[np.isin(table.page_ids[last], ids)]
+        table = table.take(rows)
+        counts = np.diff(table.offsets)
+        src = np.repeat(np.searchsorted(ids, table.page_ids), counts)
+        dst = np.minimum(np.searchsorted(ids, table.targets), max(n - 1, 0))
+        keep = ids[dst] == table.targets if n else np.zeros(len(dst), dtype=bool)
+        src, dst = src[keep], dst[keep]
+        in_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst, minlength=n), out=in_indptr[1:])
+        out_degree = np.bincount(src, minlength=n)
+        return cls(
+            ids=ids,
+            in_indptr=in_indptr,
+            in_indices=src[np.argsort(dst, kind="stable")].astype(np.int32),
+            out_degree=out_degree,
+            inv_out_degree=1.0 / np.maximum(out_degree, 1),
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.in_indices)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.ids, self.in_indptr, self.in_indices, self.out_degree, self.inv_out_degree, *(self._out_csr or ())]
+        return sum(a.nbytes for a in arrays)
+
+    def index_of(self, page_id: int) -> int:
+        i = int(np.searchsorted(self.ids, page_id, sorter=self._id_sorter))
+        if i < self.num_nodes and self._id_sorter is not None:
+            i = int(self._id_sorter[i])
+        if i == self.num_nodes or self.ids[i] != page_id:
+            raise KeyError(page_id)
+        return i
+
+    def out_neighbors(self, page_id: int) -> np.ndarray:
+        """Page ids ``page_id`` links to, with repeats for repeated links."""
+        out_indptr, out_indices = self.out_csr()
+        i = self.index_of(page_id)
+        return self.ids[out_indices[out_indptr[i] : out_indptr[i + 1]]]
+
+    def in_neighbors(self, page_id: int) -> np.ndarray:
+        """Page ids linking to ``page_id``, with repeats for repeated links."""
+        i = self.index_of(page_id)
+        return self.ids[self.in_indices[self.in_indptr[i] : self.in_indptr[i + 1]]]
+
+    def degrees(self) -> tuple[np.ndarray, np.ndarray]:
+        """Out- and in-degree of every node, counted over the edge arrays."""
+        return np.bincount(self.in_indices, minlength=self.num_nodes), np.diff(self.in_indptr)
+
+    def out_csr(self) -> tuple[np.ndarray, np.ndarray]:
+        """Out-edge CSR ``(out_indptr, out_indices)``, transposed from the in-edges on first use."""
+        if self._out_csr is None:
+            targets = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.in_indptr))
+            out_indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.in_indices, minlength=self.num_nodes), out=out_indptr[1:])
+            self._out_csr = out_indptr, targets[np.argsort(self.in_indices, kind="stable")]
+        return self._out_csr
+
+    def permuted(self, order: np.ndarray) -> "CSRGraph":
+        """The same graph with node ``i`` relabelled as old node ``order[i]``.
+
+        In-neighbour lists are relabelled and sorted, so a row gathers ranks in
+        increasing index order. ``ids`` follow the nodes and are no longer
+        sorted; ``index_of`` still works through a stored sorter.
+        """
+        n = self.num_nodes
+        new_index = invert_permutation(order)
+        counts = np.diff(self.in_indptr)[order]
+        in_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=in_indptr[1:])
+        sources = new_index[self.in_indices[ragged_indices(self.in_indptr[order], counts)]]
+        keys = np.repeat(np.arange(n, dtype=np.int64), counts) * n + sources
+        keys.sort()
+        sorter = np.arange(n) if self._id_sorter is None else self._id_sorter
+        return CSRGraph(
+            ids=self.ids[order],
+            in_indptr=in_indptr,
+            in_indices=(keys % max(n, 1)).astype(np.int32),
+            out_degree=self.out_degree[order],
+            inv_out_degree=self.inv_out_degree[order],
+            _id_sorter=new_index[sorter],
+        )
+
+    def in_sums(self, edge_values: np.ndarray, lo: int = 0, hi: int | None = None) -> np.ndarray:
+        """Sum per-edge values into target rows ``lo:hi``.
+
+        ``edge_values`` is aligned with ``in_indices[in_indptr[lo]:in_indptr[hi]]``.
+        """
+        return segment_sums(self.in_indptr, edge_values, lo, self.num_nodes if hi is None else hi)
+
+
+def segment_sums(indptr: np.ndarray, edge_values: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    """Sum ``edge_values`` (aligned with edges ``indptr[lo]:indptr[hi]``) into rows ``lo:hi``."""
+    out = np.zeros(hi - lo)
+    starts = indptr[lo:hi]
+    nonempty = starts < indptr[lo + 1 : hi + 1]
+    if edge_values.size:
+        out[nonempty] = np.add.reduceat(edge_values, starts[nonempty] - indptr[lo])
+    return out
+
+
+def invert_permutation(order: np.ndarray) -> np.ndarray:
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order), dtype=order.dtype)
+    return inverse
+
+
+REORDERINGS = ("none", "degree", "bfs", "community")
+
+
+def _undirected_csr(graph: CSRGraph) -> tuple[np.ndarray, np.ndarray]:
+    """``(indptr, indices)`` listing every node's in- and out-neighbours together."""
+    out_indptr, out_indices = graph.out_csr()
+    n = graph.num_nodes
+    rows = np.concatenate([
+        np.repeat(np.arange(n), np.diff(graph.in_indptr)),
+        np.repeat(np.arange(n), np.diff(out_indptr)),
+    ])
+    cols = np.concatenate([graph.in_indices, out_indices]).astype(np.int64)
+    perm = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, cols[perm]
+
+
+def _bfs_order(graph: CSRGraph) -> np.ndarray:
+    """Breadth-first order over the undirected graph, one level at a time.
+
+    Each component starts from its highest in-degree node; within a level,
+    nodes keep the order in which they were first reached. Isolated nodes go last.
+    """
+    n = graph.num_nodes
+    indptr, indices = _undirected_csr(graph)
+    degree = np.diff(indptr)
+    roots = np.argsort(-np.diff(graph.in_indptr), kind="stable")
+    roots = roots[degree[roots] > 0]
+    seen = np.zeros(n, dtype=bool)
+    levels = []
+    next_root = 0
+    while True:
+        while next_root < len(roots) and seen[roots[next_root]]:
+            next_root += 1
+        if next_root == len(roots):
+            break
+        frontier = roots[next_root : next_root + 1]
+        seen[frontier] = True
+        while len(frontier):
+            levels.append(frontier)
+            starts = indptr[frontier]
+            reached = indices[ragged_indices(starts, indptr[frontier + 1] - starts)]
+            reached = reached[~seen[reached]]
+            _, first = np.unique(reached, return_index=True)
+            frontier = reached[np.sort(first)]
+            seen[frontier] = True
+    levels.append(np.flatnonzero(~seen))
+    return np.concatenate(levels)
+
+
+def _community_order(graph: CSRGraph, rounds: int = 5, seed: int = 0) -> np.ndarray:
+    """Group nodes by label-propagation community, largest communities first.
+
+    Every round a random half of the nodes adopts the label most common among
+    its in- and out-neighbours (ties to the smallest label). Updating only half
+    the nodes per round keeps synchronous propagation from oscillating.
+    Within a community, nodes are ordered by in-degree.
+    """
+    n = graph.num_nodes
+    indptr, indices = _undirected_csr(graph)
+    rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+    labels = np.arange(n, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    for _ in range(rounds):
+        keys = rows * n + labels[indices]
+        keys.sort()
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else keys
+        counts = np.diff(np.r_[starts, len(keys)])
+        node, label = np.divmod(keys[starts], max(n, 1))
+        # Runs are sorted by (node, label): the first run reaching the node's max count wins.
+        node_starts = np.flatnonzero(np.r_[True, node[1:] != node[:-1]]) if len(node) else node
+        best = np.repeat(np.maximum.reduceat(counts, node_starts), np.diff(np.r_[node_starts, len(node)]))
+        winners = np.flatnonzero(counts == best)
+        winners = winners[np.r_[True, node[winners][1:] != node[winners][:-1]]] if len(winners) else winners
+        winners = winners[rng.random(len(winners)) < 0.5]
+        labels[node[winners]] = label[winners]
+    sizes = np.bincount(labels, minlength=n)
+    return np.lexsort((-np.diff(graph.in_indptr), labels, -sizes[labels]))
+
+
+def node_order(graph: CSRGraph, method: str) -> np.ndarray:
+    """Permutation ``order`` (new index -> old index) for ``CSRGraph.permuted``.
+
+    "degree" puts the most-linked pages first, "bfs" follows breadth-first
+    levels, and "community" keeps label-propagation communities contiguous.
+    """
+    if method not in REORDERINGS:
+        raise ValueError(f"Unknown node ordering: {method}")
+    if method == "degree":
+        return np.argsort(-np.diff(graph.in_indptr), kind="stable")
+    if method == "bfs":
+        return _bfs_order(graph)
+    if method == "community":
+        return _community_order(graph)
+    return np.arange(graph.num_nodes)
+
+
+PAGERANK_SOLVERS = ("power", "gauss-seidel", "aitken", "quadratic")
+# Rows per in-place Gauss-Seidel block: small enough that most rows see fresh values,
+# large enough that the per-block NumPy call overhead stays below the sweep itself.
+GAUSS_SEIDEL_BLOCK_SIZE = 256
+
+
+@dataclass
+class PageRankResult:
+    ranks: np.ndarray
+    iterations: int
+    residuals: list[float]
+    converged: bool
+
+    @property
+    def residual(self) -> float:
+        return self.residuals[-1] if self.residuals else 0.0
+
+
+def _residual(delta: np.ndarray, norm: str) -> float:
+    if not delta.size:
+        return 0.0
+    return float(np.abs(delta).max() if norm == "linf" else np.abs(delta).sum())
+
+
+def _aitken(history: list[np.ndarray]) -> np.ndarray:
+    """Componentwise Aitken delta-squared extrapolation from the last three iterates."""
+    x0, x1, x2 = history[-3:]
+    d1 = x1 - x0
+    d2 = x2 - x1
+    denom = d2 - d1
+    safe = np.abs(denom) > 1e-300
+    out = x2.copy()
+    out[safe] -= d2[safe] ** 2 / denom[safe]
+    return np.maximum(out, 0.0)
+
+
+def _quadratic(history: list[np.ndarray]) -> np.ndarray:
+    """Quadratic extrapolation from the last four iterates.
+
+    Fits the monic quadratic ``t^2 + c1*t + c0`` that best annihilates the
+    successive differences, then combines the last three iterates with its
+    coefficients to cancel the two slowest error components.
+    """
+    x0, x1, x2, x3 = history[-4:]
+    d = np.column_stack([x1 - x0, x2 - x1])
+    (c0, c1), *_ = np.linalg.lstsq(d, -(x3 - x2), rcond=None)
+    total = 1.0 + c1 + c0
+    if abs(total) < 1e-12:
+        return x3
+    return np.maximum((c0 * x1 + c1 * x2 + x3) / total, 0.0)
+
+
+def pagerank_csr(
+    graph: CSRGraph,
+    conv_threshold: float = 1e-6,
+    damping: float = 0.85,
+    solver: str = "power",
+    norm: str = "l1",
+    max_iter: int = 1000,
+    extrapolate_every: int = 10,
+    block_size: int = GAUSS_SEIDEL_BLOCK_SIZE,
+) -> PageRankResult:
+    """Iterate to a fixed point of ``pr = (1 - d)/n + d * M pr``.
+
+    Stops once the ``norm`` ("l1" or "linf") of the change between sweeps is at
+    most ``conv_threshold``. ``solver`` is one of ``PAGERANK_SOLVERS``:
+    "power" is plain Jacobi iteration, "gauss-seidel" is block Gauss-Seidel
+    that updates ``block_size`` rows at a time in place so later blocks see the
+    new values, and "aitken"/"quadratic" are power iteration with an
+    extrapolation step every ``extrapolate_every`` sweeps. Rows inside one
+    Gauss-Seidel block are updated together, Jacobi-style, so a graph with at
+    most ``block_size`` nodes gets plain power iteration.
+    """
+    if solver not in PAGERANK_SOLVERS:
+        raise ValueError(f"Unknown PageRank solver: {solver}")
+    n = graph.num_nodes
+    pr = np.full(n, 1.0 / n)
+    base = (1.0 - damping) / n
+    residuals: list[float] = []
+    history: list[np.ndarray] = []
+    needed = {"aitken": 3, "quadratic": 4}.get(solver, 0)
+
+    for it in range(1, max_iter + 1):
+        if solver == "gauss-seidel":
+            old = pr.copy()
+            for lo in range(0, n, block_size):
+                hi = min(lo + block_size, n)
+                src = graph.in_indices[graph.in_indptr[lo] : graph.in_indptr[hi]]
+                pr[lo:hi] = base + damping * graph.in_sums(pr[src] * graph.inv_out_degree[src], lo, hi)
+            residuals.append(_residual(pr - old, norm))
+        else:
+            contrib = pr * graph.inv_out_degree
+            new_pr = base + damping * graph.in_sums(contrib[graph.in_indices])
+            residuals.append(_residual(new_pr - pr, norm))
+            pr = new_pr
+            if needed:
+                history.append(pr)
+                del history[:-needed]
+                if it % extrapolate_every == 0 and len(history) == needed:
+                    pr = _aitken(history) if solver == "aitken" else _quadratic(history)
+                    history.clear()
+        if residuals[-1] <= conv_threshold:
+            return PageRankResult(pr, it, residuals, True)
+    return PageRankResult(pr, max_iter, residuals, False)
+
+
+class SharedArrays:
+    """Named NumPy arrays in shared memory that worker processes can attach to by spec."""
+
+    def __init__(self, spec: dict[str, tuple[str, str, tuple[int, ...]]], create: bool = False) -> None:
+        self.spec = spec
+        self._segments: list[SharedMemory] = []
+        self.arrays: dict[str, np.ndarray] = {}
+        for key, (shm_name, dtype, shape) in spec.items():
+            shm = SharedMemory(name=shm_name)
+            self._segments.append(shm)
+            self.arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, arrays: dict[str, np.ndarray]) -> "SharedArrays":
+        spec = {}
+        for key, arr in arrays.items():
+            shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            spec[key] = (shm.name, arr.dtype.str, arr.shape)
+            shm.close()
+        return cls(spec)
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.arrays[key]
+
+    def close(self, unlink: bool = False) -> None:
+        self.arrays.clear()
+        for shm in self._segments:
+            shm.close()
+            if unlink:
+                shm.unlink()
+        self._segments.clear()
+
+
+def _pagerank_worker(spec: dict, lo: int, hi: int, slot: int, barrier, base: float, damping: float, norm: str) -> None:
+    """Compute rows ``lo:hi`` of every iteration; see ``pagerank_parallel`` for the barrier protocol."""
+    shared = SharedArrays(spec)
+    try:
+        indptr, indices, inv = shared["in_indptr"], shared["in_indices"], shared["inv_out_degree"]
+        x, contrib, partial, stop = shared["x"], shared["contrib"], shared["partial"], shared["stop"]
+        src = indices[indptr[lo] : indptr[hi]]
+        it = 0
+        while True:
+            cur, nxt = x[it % 2], x[(it + 1) % 2]
+            contrib[lo:hi] = cur[lo:hi] * inv[lo:hi]
+            barrier.wait()
+            nxt[lo:hi] = base + damping * segment_sums(indptr, contrib[src], lo, hi)
+            partial[slot] = _residual(nxt[lo:hi] - cur[lo:hi], norm)
+            barrier.wait()
+            barrier.wait()
+            if stop[0]:
+                break
+            it += 1
+    except Exception:
+        barrier.abort()
+        raise
+    finally:
+        shared.close()
+
+
+def pagerank_parallel(
+    graph: CSRGraph,
+    workers: int,
+    conv_threshold: float = 1e-6,
+    damping: float = 0.85,
+    norm: str = "l1",
+    max_iter: int = 1000,
+) -> PageRankResult:
+    """Power iteration split across ``workers`` processes over shared memory.
+
+    The CSR arrays and a double-buffered rank vector live in shared memory.
+    Nodes are split into contiguous blocks with about the same number of
+    in-edges. Each iteration every worker writes its block's contributions,
+    waits at a barrier, gathers its block of the next vector, reports a partial
+    residual and waits again. The parent then sums the residuals, sets the stop
+    flag and releases everyone through a third barrier.
+    """
+    n = graph.num_nodes
+    x = np.empty((2, n))
+    x[0] = 1.0 / n
+    shared = SharedArrays.create({
+        "in_indptr": graph.in_indptr,
+        "in_indices": graph.in_indices,
+        "inv_out_degree": graph.inv_out_degree,
+        "x": x,
+        "contrib": np.empty(n),
+        "partial": np.zeros(workers),
+        "stop": np.zeros(1, dtype=np.int64),
+    })
+    bounds = np.searchsorted(graph.in_indptr, np.linspace(0, graph.in_indptr[-1], workers + 1)).tolist()
+    bounds[0], bounds[-1] = 0, n
+    ctx = multiprocessing.get_context()
+    barrier = ctx.Barrier(workers + 1)
+    procs = [
+        ctx.Process(
+            target=_pagerank_worker,
+            args=(shared.spec, bounds[w], bounds[w + 1], w, barrier, (1.0 - damping) / n, damping, norm),
+            daemon=True,
+        )
+        for w in range(workers)
+    ]
+    residuals: list[float] = []
+    try:
+        for p in procs:
+            p.start()
+        while True:
+            barrier.wait()
+            barrier.wait()
+            partial = shared["partial"]
+            residuals.append(float(partial.max() if norm == "linf" else partial.sum()))
+            done = residuals[-1] <= conv_threshold or len(residuals) >= max_iter
+            shared["stop"][0] = done
+            barrier.wait()
+            if done:
+                break
+        for p in procs:
+            p.join()
+        ranks = shared["x"][len(residuals) % 2].copy()
+    except BaseException:
+        barrier.abort()
+        for p in procs:
+            p.terminate()
+        raise
+    finally:
+        shared.close(unlink=True)
+    return PageRankResult(ranks, len(residuals), residuals, residuals[-1] <= conv_threshold)
+
+
+class EdgeBlockStore:
+    """Out-of-core link graph: edges on disk in blocks, memory-mapped one at a time.
+
+    Nodes are dense indices into ``ids``. Block ``k`` holds every edge whose
+    target lies in ``[k * block_nodes, (k + 1) * block_nodes)``, sorted by
+    target, as ``block-k.src.npy`` (source indices) plus ``block-k.indptr.npy``
+    (per-target offsets). Only node-sized arrays are kept in memory.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        meta = json.loads((self.root / "meta.json").read_text())
+        self.block_nodes = meta["block_nodes"]
+        self.num_blocks = meta["num_blocks"]
+        self.num_edges = meta["num_edges"]
+        self.ids = np.load(self.root / "ids.npy")
+        self.out_degree = np.load(self.root / "out_degree.npy")
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.ids)
+
+    def block(self, k: int) -> tuple[int, int, np.ndarray, np.ndarray]:
+        """Return ``(lo, hi, indptr, src)`` for block ``k``; ``src`` is memory-mapped."""
+        lo = k * self.block_nodes
+        hi = min(lo + self.block_nodes, self.num_nodes)
+        indptr = np.load(self.root / f"block-{k:05d}.indptr.npy")
+        src = np.load(self.root / f"block-{k:05d}.src.npy", mmap_mode="r")
+        return lo, hi, indptr, src
+
+    def in_degree(self) -> np.ndarray:
+        return np.concatenate([np.diff(self.block(k)[2]) for k in range(self.num_blocks)] or [np.zeros(0, np.int64)])
+
+    @classmethod
+    def build(cls, root: Path, page_ids: np.ndarray, chunks, block_nodes: int | None = None, max_blocks: int = 256):
+        """Write a store from ``parse_chunk``-style ``(page_ids, counts, targets)`` chunks.
+
+        Edges are first appended to one spill file per target block, so memory
+        holds at most one chunk; each block is then sorted by target on its own.
+        """
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        ids = np.unique(np.asarray(page_ids, dtype=np.int64))
+        n = len(ids)
+        if n >= 2**31:
+            raise ValueError("EdgeBlockStore supports fewer than 2**31 pages")
+        block_nodes = max(block_nodes or 1 << 18, -(-n // max_blocks), 1)
+        num_blocks = -(-n // block_nodes)
+        out_degree = np.zeros(n, dtype=np.int64)
+        num_edges = 0
+        spills = [open(root / f"block-{k:05d}.spill", "wb") for k in range(num_blocks)]
+        try:
+            for chunk_ids, counts, targets in chunks:
+                src = np.repeat(np.searchsorted(ids, chunk_ids), counts)
+                dst = np.minimum(np.searchsorted(ids, targets), n - 1)
+                keep = ids[dst] == targets
+                src, dst = src[keep], dst[keep]
+                np.add.at(out_degree, src, 1)
+                num_edges += len(src)
+                bucket = dst // block_nodes
+                order = np.argsort(bucket, kind="stable")
+                pairs = np.column_stack((src, dst))[order].astype(np.int32)
+                bounds = np.concatenate([[0], np.cumsum(np.bincount(bucket, minlength=num_blocks))])
+                for k in np.flatnonzero(np.diff(bounds)).tolist():
+                    pairs[bounds[k] : bounds[k + 1]].tofile(spills[k])
+        finally:
+            for f in spills:
+                f.close()
+
+        for k in range(num_blocks):
+            spill = root / f"block-{k:05d}.spill"
+            lo = k * block_nodes
+            hi = min(lo + block_nodes, n)
+            pairs = np.fromfile(spill, dtype=np.int32).reshape(-1, 2)
+            order = np.argsort(pairs[:, 1], kind="stable")
+            indptr = np.zeros(hi - lo + 1, dtype=np.int64)
+            np.cumsum(np.bincount(pairs[:, 1] - lo, minlength=hi - lo), out=indptr[1:])
+            np.save(root / f"block-{k:05d}.src.npy", pairs[order, 0])
+            np.save(root / f"block-{k:05d}.indptr.npy", indptr)
+            spill.unlink()
+
+        np.save(root / "ids.npy", ids)
+        np.save(root / "out_degree.npy", out_degree)
+        meta = {"block_nodes": block_nodes, "num_blocks": num_blocks, "num_edges": num_edges}
+        (root / "meta.json").write_text(json.dumps(meta))
+        return cls(root)
+
+
+def pagerank_out_of_core(
+    store: EdgeBlockStore,
+    conv_threshold: float = 1e-6,
+    damping: float = 0.85,
+    norm: str = "l1",
+    max_iter: int = 1000,
+) -> PageRankResult:
+    """Power iteration that streams the edge blocks from disk every sweep."""
+    n = store.num_nodes
+    inv_out = 1.0 / np.maximum(store.out_degree, 1)
+    base = (1.0 - damping) / n
+    pr = np.full(n, 1.0 / n)
+    new_pr = np.empty(n)
+    residuals: list[float] = []
+    for it in range(1, max_iter + 1):
+        contrib = pr * inv_out
+        for k in range(store.num_blocks):
+            lo, hi, indptr, src = store.block(k)
+            new_pr[lo:hi] = base + damping * segment_sums(indptr, contrib[src], 0, hi - lo)
+        residuals.append(_residual(new_pr - pr, norm))
+        pr, new_pr = new_pr, pr
+        if residuals[-1] <= conv_threshold:
+            return PageRankResult(pr, it, residuals, True)
+    return PageRankResult(pr, max_iter, residuals, False)
+
+
+class StageProfiler:
+    """Wall time, CPU time and tracemalloc peak per named stage of a run.
+
+    CPU time includes reaped child processes, so process-pool parsing and
+    ``--parallel`` PageRank are counted. A disabled profiler only runs the body.
+    """
+
+    def __init__(self, enabled: bool = True, trace_memory: bool = True) -> None:
+        self.enabled = enabled
+        self.trace_memory = trace_memory and enabled
+        self.stages: list[dict] = []
+
+    @staticmethod
+    def _cpu_seconds() -> float:
+        children = os.times()
+        return time.process_time() + children.children_user + children.children_system
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield {}
+            return
+        record = {"stage": name}
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), self._cpu_seconds()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall
+            record["cpu_seconds"] = self._cpu_seconds() - cpu
+            if self.trace_memory:
+                record["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            self.stages.append(record)
+
+    def record_pagerank(self, record: dict, result: PageRankResult) -> None:
+        """Attach iteration count and per-iteration residuals to a stage record."""
+        if self.enabled:
+            record.update(iterations=result.iterations, converged=result.converged, residuals=list(result.residuals))
+
+    def report(self) -> dict:
+        return {
+            "stages": self.stages,
+            "total_wall_seconds": sum(r["wall_seconds"] for r in self.stages),
+            "total_cpu_seconds": sum(r["cpu_seconds"] for r in self.stages),
+        }
+
+    def print_table(self) -> None:
+        print(f"{'stage':<14} {'wall s':>9} {'cpu s':>9} {'peak MiB':>9}  notes")
+        for r in self.stages:
+            peak = f"{r['peak_bytes'] / 2**20:9.1f}" if "peak_bytes" in r else f"{'-':>9}"
+            notes = ""
+            if "iterations" in r:
+                last = r["residuals"][-1] if r["residuals"] else float("nan")
+                notes = f"{r['iterations']} iterations, residual={last:.3e}"
+            elif "walks" in r:
+                notes = f"{r['walks']} walks, {r['steps']} steps"
+            print(f"{r['stage']:<14} {r['wall_seconds']:9.3f} {r['cpu_seconds']:9.3f} {peak}  {notes}".rstrip())
+        report = self.report()
+        print(f"{'total':<14} {report['total_wall_seconds']:9.3f} {report['total_cpu_seconds']:9.3f}")
+
+    def write_json(self, path: Path) -> None:
+        path.write_text(json.dumps(self.report(), indent=2) + "\n")
+
+
+def run_out_of_core(
+    html_paths: list[Path],
+    store_dir: Path,
+    workers: int | None = None,
+    block_nodes: int | None = None,
+    conv_threshold: float = 1e-6,
+    norm: str = "l1",
+    profiler: StageProfiler | None = None,
+    top: int = 5,
+) -> None:
+    """Parse pages straight into an ``EdgeBlockStore`` and run the pipeline from disk."""
+    profiler = profiler or StageProfiler(enabled=False)
+    page_ids = np.fromiter((int(p.stem) for p in html_paths), dtype=np.int64, count=len(html_paths))
+    with profiler.stage("ingest"):
+        store = EdgeBlockStore.build(store_dir, page_ids, iter_parse_chunks(html_paths, workers), block_nodes)
+    print(f"Out-of-core store: {store.num_edges} edges in {store.num_blocks} blocks under {store_dir}")
+    with profiler.stage("degree_stats"):
+        print_stats(store.out_degree, store.in_degree())
+    with profiler.stage("pagerank") as record:
+        result = pagerank_out_of_core(store, conv_threshold=conv_threshold, norm=norm)
+        profiler.record_pagerank(record, result)
+    status = "converged" if result.converged else "stopped"
+    print(f"PageRank (out-of-core): {status} after {result.iterations} iterations, {norm} residual={result.residual:.3e}")
+    print_top(store.ids, result.ranks, top)
+
+
+RANK_CACHE_NAME = ".hw2-ranks.npz"
+
+
+def save_ranks(path: Path, graph: CSRGraph, ranks: np.ndarray) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, ids=graph.ids, ranks=ranks)
+    os.replace(tmp_path, path)
+
+
+def load_ranks(path: Path) -> tuple[np.ndarray, np.ndarray] | None:
+    """Return the ``(ids, ranks)`` saved by a previous run, or None."""
+    try:
+        with np.load(path) as data:
+            return data["ids"], data["ranks"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def warm_start_vector(graph: CSRGraph, prev_ids: np.ndarray, prev_ranks: np.ndarray) -> np.ndarray:
+    """Previous ranks mapped onto the current nodes by page id; new pages start at ``1/n``."""
+    x = np.full(graph.num_nodes, 1.0 / graph.num_nodes)
+    if len(prev_ids):
+        pos = np.minimum(np.searchsorted(prev_ids, graph.ids), len(prev_ids) - 1)
+        known = prev_ids[pos] == graph.ids
+        x[known] = prev_ranks[pos[known]]
+    return x
+
+
+def pagerank_incremental(
+    graph: CSRGraph,
+    x0: np.ndarray,
+    conv_threshold: float = 1e-6,
+    damping: float = 0.85,
+    max_iter: int = 1000,
+    dense_fraction: int = 4,
+) -> PageRankResult:
+    """Refine a warm-start rank vector by pushing residuals from where they are nonzero.
+
+    The residual ``r = (1 - d)/n + d*M x - x`` of a previous solution is
+    concentrated around pages whose links changed. Each round moves every
+    residual above ``conv_threshold / n`` into ``x`` and spreads ``d`` times it
+    over that node's out-links, so work is proportional to the out-edges of the
+    nodes still active; once more than ``1/dense_fraction`` of the nodes are
+    active, a round pushes all of them as one sparse product instead. Stops
+    once ``||r||_1 <= conv_threshold``; ``r`` is exactly the change a power
+    iteration step would make, so the tolerance means the same as for
+    ``pagerank_csr``.
+    """
+    n = graph.num_nodes
+    out_indptr, out_indices = graph.out_csr()
+    x = x0.astype(float, copy=True)
+    r = (1.0 - damping) / n + damping * graph.in_sums((x * graph.inv_out_degree)[graph.in_indices]) - x
+    residuals = [float(np.abs(r).sum())]
+    node_threshold = conv_threshold / n
+    for it in range(1, max_iter + 1):
+        if residuals[-1] <= conv_threshold:
+            return PageRankResult(x, it - 1, residuals, True)
+        active = np.flatnonzero(np.abs(r) > node_threshold)
+        if len(active) > n // dense_fraction:
+            # the frontier has spread over much of the graph: push every node with one pull-style product
+            x += r
+            r = damping * graph.in_sums((r * graph.inv_out_degree)[graph.in_indices])
+        else:
+            delta = r[active]
+            r[active] = 0.0
+            x[active] += delta
+            starts = out_indptr[active]
+            counts = out_indptr[active + 1] - starts
+            spread = np.repeat(damping * delta * graph.inv_out_degree[active], counts)
+            np.add.at(r, out_indices[ragged_indices(starts, counts)], spread)
+        residuals.append(float(np.abs(r).sum()))
+    return PageRankResult(x, max_iter, residuals, residuals[-1] <= conv_threshold)
+
+
+class PersonalizedPageRank:
+    """Answers personalized PageRank queries against one graph with forward push.
+
+    Approximates ``x = (1 - d) * s + d * M x`` for a seed distribution ``s``
+    (Andersen, Chung & Lang). Mass starts as residual on the seeds. Any node
+    whose residual exceeds ``tol`` times its out-degree keeps a ``1 - d``
+    share and pushes the rest evenly to its out-links. Only nodes that
+    received mass in the previous round are re-examined, so a query touches
+    the seeds' neighbourhood rather than the whole graph.
+    """
+
+    def __init__(self, graph: CSRGraph, damping: float = 0.85) -> None:
+        self.graph = graph
+        self.damping = damping
+        self.out_indptr, self.out_indices = graph.out_csr()
+        self._push_threshold = np.maximum(graph.out_degree, 1)
+
+    def scores(self, seeds: list[int], tol: float = 1e-5, max_rounds: int = 10_000) -> tuple[np.ndarray, np.ndarray]:
+        """Return ``(nodes, scores)`` for every node the push reached, as dense indices."""
+        graph = self.graph
+        seed_idx = np.unique([graph.index_of(s) for s in seeds])
+        p = np.zeros(graph.num_nodes)
+        r = np.zeros(graph.num_nodes)
+        r[seed_idx] = 1.0 / len(seed_idx)
+        touched = [seed_idx]
+        candidates = seed_idx
+        for _ in range(max_rounds):
+            active = candidates[r[candidates] > tol * self._push_threshold[candidates]]
+            if not len(active):
+                break
+            mass = r[active]
+            r[active] = 0.0
+            p[active] += (1.0 - self.damping) * mass
+            starts = self.out_indptr[active]
+            counts = self.out_indptr[active + 1] - starts
+            targets = self.out_indices[ragged_indices(starts, counts)]
+            np.add.at(r, targets, np.repeat(self.damping * mass * graph.inv_out_degree[active], counts))
+            candidates = np.unique(targets)
+            touched.append(candidates)
+        nodes = np.unique(np.concatenate(touched))
+        return nodes, p[nodes]
+
+    def top_k(self, seeds: list[int], k: int = 10, tol: float = 1e-5, exclude_seeds: bool = False) -> list[tuple[int, float]]:
+        """The ``k`` highest-scoring ``(page_id, score)`` pairs for ``seeds``."""
+        nodes, scores = self.scores(seeds, tol=tol)
+        if exclude_seeds:
+            keep = ~np.isin(self.graph.ids[nodes], seeds)
+            nodes, scores = nodes[keep], scores[keep]
+        if len(nodes) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            nodes, scores = nodes[best], scores[best]
+        order = np.lexsort((self.graph.ids[nodes], -scores))
+        return [(int(self.graph.ids[i]), float(v)) for i, v in zip(nodes[order], scores[order])]
+
+
+@dataclass
+class MonteCarloResult:
+    """Random-walk PageRank estimates with their standard errors."""
+
+    ranks: np.ndarray
+    stderr: np.ndarray
+    walks: int
+    steps: int
+
+    def top_k(self, k: int, z: float = 1.96) -> tuple[np.ndarray, int]:
+        """Dense indices of the ``k`` best estimates and how many of them are certain.
+
+        A node counts as certain when its lower bound ``rank - z * stderr``
+        exceeds the upper bound of the best node outside the top ``k``.
+        """
+        k = min(k, len(self.ranks))
+        order = np.argsort(-self.ranks, kind="stable")
+        top, rest = order[:k], order[k:]
+        if not len(rest):
+            return top, k
+        outside = (self.ranks[rest] + z * self.stderr[rest]).max()
+        return top, int(np.count_nonzero(self.ranks[top] - z * self.stderr[top] > outside))
+
+
+def pagerank_monte_carlo(
+    graph: CSRGraph,
+    walks_per_node: int = 16,
+    damping: float = 0.85,
+    batches: int = 8,
+    seed: int | None = None,
+    max_walks: int = 1 << 22,
+) -> MonteCarloResult:
+    """Estimate PageRank from random walks instead of iterating to a fixed point.
+
+    Every node starts ``walks_per_node`` walks; at each step a walk follows a
+    random out-link with probability ``d`` and stops otherwise (or at a page
+    with no out-links, where the exact iteration leaks that mass too). A node's
+    expected visit count is then ``R * n / (1 - d)`` times its PageRank
+    (Avrachenkov et al., "complete path stopping at dangling nodes").
+
+    The walks are split into ``batches`` independent groups and the spread of
+    the per-group estimates gives each node's standard error. At most
+    ``max_walks`` walks are in flight at once.
+    """
+    n = graph.num_nodes
+    if not n:
+        return MonteCarloResult(np.zeros(0), np.zeros(0), 0, 0)
+    out_indptr, out_indices = graph.out_csr()
+    out_degree = graph.out_degree
+    rng = np.random.default_rng(seed)
+    batches = max(1, min(batches, walks_per_node))
+    reps = [walks_per_node // batches + (b < walks_per_node % batches) for b in range(batches)]
+    nodes_per_chunk = max(1, max_walks // max(reps))
+    visits = np.zeros((batches, n), dtype=np.int64)
+    steps = 0
+    for b, r in enumerate(reps):
+        for lo in range(0, n, nodes_per_chunk):
+            pos = np.repeat(np.arange(lo, min(lo + nodes_per_chunk, n), dtype=np.int64), r)
+            path = [pos]
+            while len(pos):
+                # One uniform draw per step: u < d continues the walk and u / d picks the out-link.
+                u = rng.random(len(pos))
+                keep = (u < damping) & (out_degree[pos] > 0)
+                pos = pos[keep]
+                pick = (u[keep] / damping * out_degree[pos]).astype(np.int64)
+                pos = out_indices[out_indptr[pos] + pick].astype(np.int64)
+                path.append(pos)
+                steps += len(pos)
+            visits[b] += np.bincount(np.concatenate(path), minlength=n)
+    scale = (1.0 - damping) / n
+    total = sum(reps)
+    ranks = scale * visits.sum(axis=0) / total
+    if batches > 1:
+        per_batch = scale * visits / np.array(reps)[:, None]
+        weights = np.array(reps)[:, None] / total
+        var = (weights * (per_batch - ranks) ** 2).sum(axis=0) / (batches - 1)
+        stderr = np.sqrt(var)
+    else:
+        stderr = np.full(n, np.inf)
+    return MonteCarloResult(ranks, stderr, total * n, steps)
+
+
 def pagerank(
     adjacency_list: dict,
     reverse_adjacency: dict,
     all_ids: set,
-    conv_threshold: float = 0.005,
+    conv_threshold: float = 1e-6,
+    solver: str = "power",
+    norm: str = "l1",
 ) -> dict[int, float]:
-    n = len(all_ids)
-    ids_list = sorted(all_ids)
-    pr = {i: 1.0 / n for i in ids_list}
+    if not all_ids:
+        return {}
+    graph = CSRGraph.from_adjacency(adjacency_list, reverse_adjacency, all_ids)
+    result = pagerank_csr(graph, conv_threshold=conv_threshold, solver=solver, norm=norm)
+    return dict(zip(graph.ids.tolist(), result.ranks.tolist()))
 
-    def out_degree(node):
-        c = len(adjacency_list.get(node, []))
-        return c if c > 0 else 1
 
-    while True:
-        new_pr = {}
-        for a in ids_list:
-            incoming = reverse_adjacency.get(a, [])
-            contrib = sum(pr[t] / out_degree(t) for t in incoming)
-            new_pr[a] = 0.15 / n + 0.85 * contrib
-        total_old = sum(pr.values())
-        total_new = sum(new_pr.values())
-        if total_old == 0:
-            break
-        if abs(total_new - total_old) / total_old <= conv_threshold:
-            break
-        pr = new_pr
-    return pr
+def print_top(ids: np.ndarray, ranks: np.ndarray, k: int = 5) -> None:
+    print(f"Top {k} by PageRank:")
+    for i in np.argsort(-ranks, kind="stable")[:k]:
+        print(f"  {ids[i]}  {ranks[i]:.6f}")
 
 
-def run_pipeline(all_ids: set, adjacency_list: dict) -> None:
-    rev = build_reverse_adjacency(adjacency_list, all_ids)
-    out_deg = {nid: len(adjacency_list.get(nid, [])) for nid in all_ids}
-    in_deg = {nid: len(rev[nid]) for nid in all_ids}
-    print_stats(out_deg, in_deg)
-    pr = pagerank(adjacency_list, rev, all_ids)
-    print("Top 5 by PageRank:")
-    for pid, score in sorted(pr.items(), key=lambda x: -x[1])[:5]:
-        print(f"  {pid}  {score:.6f}")
+def print_top_estimates(ids: np.ndarray, result: MonteCarloResult, k: int = 5, z: float = 1.96) -> None:
+    top, certain = result.top_k(k, z)
+    print(f"Top {len(top)} by PageRank (estimate ± {z:g} stderr), {certain} certain at this bound:")
+    for i in top:
+        print(f"  {ids[i]}  {result.ranks[i]:.6f} ± {z * result.stderr[i]:.6f}")
+
+
+def run_pipeline(
+    graph: CSRGraph,
+    solver: str = "power",
+    conv_threshold: float = 1e-6,
+    norm: str = "l1",
+    rank_cache: Path | None = None,
+    incremental: bool = False,
+    parallel: int = 1,
+    profiler: StageProfiler | None = None,
+    walks_per_node: int = 0,
+    top: int = 5,
+    reorder: str = "none",
+    block_size: int = GAUSS_SEIDEL_BLOCK_SIZE,
+) -> None:
+    """Print degree stats and the PageRank top ``top``.
+
+    With ``rank_cache`` the final ranks are saved there; with ``incremental`` the
+    ranks saved by the previous run are refined instead of starting from ``1/n``.
+    A positive ``walks_per_node`` estimates the ranks with Monte Carlo walks
+    instead; those estimates are never saved to the rank cache. ``reorder``
+    relabels the nodes (see ``node_order``) before iterating; ranks are mapped
+    back to the original nodes afterwards.
+    """
+    profiler = profiler or StageProfiler(enabled=False)
+    with profiler.stage("degree_stats"):
+        print_stats(*graph.degrees())
+    work, order, inverse = graph, None, None
+    if reorder != "none":
+        with profiler.stage("reorder"):
+            order = node_order(graph, reorder)
+            work, inverse = graph.permuted(order), invert_permutation(order)
+
+    def original(values: np.ndarray) -> np.ndarray:
+        return values if inverse is None else values[inverse]
+
+    if walks_per_node > 0:
+        with profiler.stage("pagerank") as record:
+            estimate = pagerank_monte_carlo(work, walks_per_node)
+            estimate.ranks, estimate.stderr = original(estimate.ranks), original(estimate.stderr)
+            record.update(walks=estimate.walks, steps=estimate.steps)
+        top_idx, _ = estimate.top_k(top)
+        relative = np.median(estimate.stderr[top_idx] / estimate.ranks[top_idx]) if len(top_idx) else 0.0
+        print(
+            f"PageRank (monte-carlo): {estimate.walks} walks, {estimate.steps} steps, "
+            f"median relative stderr of the top {len(top_idx)}={relative:.1%}"
+        )
+        with profiler.stage("output"):
+            print_top_estimates(graph.ids, estimate, top)
+        return
+    previous = load_ranks(rank_cache) if incremental and rank_cache else None
+    with profiler.stage("pagerank") as record:
+        if previous is not None:
+            solver, norm = "incremental", "l1"
+            x0 = warm_start_vector(graph, *previous)
+            result = pagerank_incremental(work, x0 if order is None else x0[order], conv_threshold=conv_threshold)
+        elif parallel > 1:
+            solver = f"parallel x{parallel}"
+            result = pagerank_parallel(work, parallel, conv_threshold=conv_threshold, norm=norm)
+        else:
+            result = pagerank_csr(work, conv_threshold=conv_threshold, solver=solver, norm=norm, block_size=block_size)
+        result.ranks = original(result.ranks)
+        profiler.record_pagerank(record, result)
+    status = "converged" if result.converged else "stopped"
+    print(f"PageRank ({solver}): {status} after {result.iterations} iterations, {norm} residual={result.residual:.3e}")
+    with profiler.stage("output"):
+        print_top(graph.ids, result.ranks, top)
+        if rank_cache:
+            try:
+                save_ranks(rank_cache, graph, result.ranks)
+            except OSError as e:
+                print(f"Could not write rank cache {rank_cache}: {e}")
+
+
+def run_queries(cache_path: Path, seeds: list[int], k: int, tol: float) -> None:
+    """Answer personalized PageRank queries for ``seeds``, or for each line of stdin if none are given."""
+    cached = load_graph_cache(cache_path)
+    if cached is None:
+        print(f"Graph cache not found: {cache_path} (run hw2.py --cache {cache_path} on the data directory first)")
+        return
+    start = time.perf_counter()
+    ppr = PersonalizedPageRank(CSRGraph.from_links(cached[0]))
+    print(f"Loaded {ppr.graph.num_nodes} pages, {ppr.graph.num_edges} links in {time.perf_counter() - start:.2f}s")
+    queries = [seeds] if seeds else ([int(t) for t in line.split()] for line in sys.stdin if line.strip())
+    for query in queries:
+        start = time.perf_counter()
+        try:
+            top = ppr.top_k(query, k=k, tol=tol, exclude_seeds=True)
+        except KeyError as e:
+            print(f"Unknown page id: {e.args[0]}")
+            continue
+        print(f"Top {k} relative to {' '.join(map(str, query))} ({(time.perf_counter() - start) * 1000:.1f} ms):")
+        for pid, score in top:
+            print(f"  {pid}  {score:.6f}")
 
 
 def run_test() -> None:
@@ -109,10 +1630,192 @@ def run_test() -> None:
     in_deg = {nid: len(rev[nid]) for nid in all_ids}
     assert out_deg == {0: 1, 1: 1, 2: 1}
     assert in_deg == {0: 1, 1: 1, 2: 1}
+    graph = CSRGraph.from_adjacency(adjacency_list, rev, all_ids)
+    assert [d.tolist() for d in graph.degrees()] == [[1, 1, 1], [1, 1, 1]]
+    # same values (and types) as statistics.median / statistics.quantiles(n=5)
+    assert degree_stats(np.array([3, 1, 4, 1, 5, 9, 2, 6, 5])) == (4.0, 4, 9, 1, [1.0, 3.0, 5.0, 6.0])
+    assert degree_stats(np.array([3, 1, 4, 1, 5, 9, 2, 6])) == (3.875, 3.5, 9, 1, [1.0, 2.6, 4.4, 6.6])
     pr = pagerank(adjacency_list, rev, all_ids, conv_threshold=1e-9)
     assert abs(sum(pr.values()) - 1.0) < 1e-6
     for pid in all_ids:
         assert abs(pr[pid] - 1.0 / 3) < 1e-5
+
+    # every solver reaches the same fixed point on a graph with a dangling node
+    all_ids = {0, 1, 2, 3, 4}
+    adjacency_list = {0: [1, 2], 1: [2], 2: [0, 3], 3: [0, 1, 2], 4: []}
+    rev = build_reverse_adjacency(adjacency_list, all_ids)
+    graph = CSRGraph.from_adjacency(adjacency_list, rev, all_ids)
+    reference = pagerank_csr(graph, conv_threshold=1e-13)
+    assert reference.converged
+    assert reference.residuals[-1] <= 1e-13 < reference.residuals[0]
+    for solver in PAGERANK_SOLVERS:
+        for norm in ("l1", "linf"):
+            result = pagerank_csr(graph, conv_threshold=1e-12, solver=solver, norm=norm, block_size=2, extrapolate_every=4)
+            assert result.converged, (solver, norm)
+            assert np.abs(result.ranks - reference.ranks).max() < 1e-9, (solver, norm)
+
+    # with blocks smaller than the graph, Gauss-Seidel needs fewer sweeps than power iteration
+    rng = np.random.default_rng(0)
+    adjacency_list = {i: rng.integers(0, 1000, rng.integers(0, 12)).tolist() for i in range(1000)}
+    all_ids = set(adjacency_list)
+    web = CSRGraph.from_adjacency(adjacency_list, build_reverse_adjacency(adjacency_list, all_ids), all_ids)
+    power = pagerank_csr(web)
+    seidel = pagerank_csr(web, solver="gauss-seidel")
+    assert power.converged and seidel.converged
+    assert seidel.iterations < power.iterations, (seidel.iterations, power.iterations)
+    assert np.abs(seidel.ranks - power.ranks).max() < 1e-6
+
+    # a warm start after an edge change reaches the cold-start fixed point
+    previous = (graph.ids, reference.ranks)
+    adjacency_list = {0: [1, 2, 4], 1: [2], 2: [0, 3], 3: [0, 1, 2], 4: [], 5: [4]}
+    all_ids = set(adjacency_list)
+    graph = CSRGraph.from_adjacency(adjacency_list, build_reverse_adjacency(adjacency_list, all_ids), all_ids)
+    out_indptr, out_indices = graph.out_csr()
+    assert np.diff(out_indptr).tolist() == graph.out_degree.tolist()
+    assert out_indices[out_indptr[0] : out_indptr[1]].tolist() == [1, 2, 4]
+    cold = pagerank_csr(graph, conv_threshold=1e-13)
+    for workers in (1, 3):
+        parallel = pagerank_parallel(graph, workers, conv_threshold=1e-13)
+        assert parallel.converged and parallel.iterations == cold.iterations
+        assert np.abs(parallel.ranks - cold.ranks).max() < 1e-15
+    warm = pagerank_incremental(graph, warm_start_vector(graph, *previous), conv_threshold=1e-13)
+    assert warm.converged
+    assert np.abs(warm.ranks - cold.ranks).max() < 1e-12
+
+    # both ingest modes parse the same links from disk
+    with tempfile.TemporaryDirectory() as tmp:
+        pages = {0: '<a href="1.html">x</a><a HREF=2>y</a>', 1: "<a href='0.html'>", 2: "no links"}
+        for pid, html in pages.items():
+            Path(tmp, f"{pid}.html").write_text(html)
+        html_paths = sorted(Path(tmp).glob("*.html"))
+        expected = [(0, [1, 2]), (1, [0]), (2, [])]
+        for mode in INGEST_MODES:
+            assert ingest(html_paths, mode=mode, workers=2, chunk_size=2) == expected, mode
+
+    # the bytes scanner agrees with the str parser, including buffer growth and mmapped files
+    html = '<a href = "7.html">a</a> x=1 <A HREF=12>b</a> href="abc.html" href=.html <a href=\'3\'>' * 50
+    scanner = LinkScanner(capacity=8, read_buffer_size=64)
+    assert scanner.scan(html.encode()) == 150
+    assert scanner.take().tolist() == parse_html_links(html)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp, "5.html")
+        path.write_text(html)
+        assert read_and_parse(path) == (5, parse_html_links(html))
+        assert scanner.scan_file(path) == 150
+        Path(tmp, "6.html").write_bytes(b"")
+        assert scanner.scan_file(Path(tmp, "6.html")) == 0
+
+        # the graph cache reparses only new or modified pages and drops removed ones
+        cache_path = Path(tmp, GRAPH_CACHE_NAME)
+        html_paths = sorted(Path(tmp).glob("*.html"))
+        first = ingest_cached(html_paths, cache_path, mode="thread")
+        assert first.items() == ingest(html_paths, mode="thread")
+        assert load_graph_cache(cache_path)[0].items() == first.items()
+        Path(tmp, "6.html").write_text('<a href="5.html">')
+        Path(tmp, "7.html").write_text('<a href="6.html">')
+        Path(tmp, "5.html").unlink()
+        html_paths = sorted(Path(tmp).glob("*.html"))
+        assert ingest_cached(html_paths, cache_path, mode="thread").items() == [(6, [5]), (7, [6])]
+        assert load_graph_cache(cache_path)[0].items() == [(6, [5]), (7, [6])]
+
+        # streaming through a local stand-in for the bucket matches the on-disk ingest
+        streamed = stream_ingest(open_source(tmp), concurrency=2, max_in_flight=1)
+        assert streamed.items() == [(6, [5]), (7, [6])]
+
+    # tar, zip and record shards all yield the same pages, with ids from the member names
+    pages = [(3, b'<a href="4.html">'), (4, b"<a href=3><a href=9>"), (10, b"")]
+    with tempfile.TemporaryDirectory() as tmp:
+        with tarfile.open(Path(tmp, "a.tar.gz"), "w:gz") as tar:
+            for pid, data in pages:
+                info = tarfile.TarInfo(f"web/{pid}.html")
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        with zipfile.ZipFile(Path(tmp, "b.zip"), "w") as zf:
+            for pid, data in pages:
+                zf.writestr(f"{pid}.html", data)
+        assert write_record_shard(Path(tmp, "c.pages"), pages) == 3
+        shards = find_shards(Path(tmp))
+        assert [p.name for p in shards] == ["a.tar.gz", "b.zip", "c.pages"]
+        for path in shards:
+            assert list(iter_shard_pages(path)) == pages, path.name
+            assert LinkTable.from_counts(*parse_shard(path)).items() == [(3, [4]), (4, [3, 9]), (10, [])]
+        # pack creates the directory part of its prefix
+        for pid, data in pages:
+            Path(tmp, f"{pid}.html").write_bytes(data)
+        packed = pack_records(sorted(Path(tmp).glob("*.html")), str(Path(tmp, "shards", "web")), 2)
+        assert [p.name for p in packed] == ["web-00000.pages", "web-00001.pages"]
+
+    # the out-of-core store holds the same graph, split over several blocks
+    items = [(0, [1, 2, 9]), (1, [2, 2]), (2, [0, 3]), (3, [0, 1, 2]), (4, []), (5, [4])]
+    all_ids, adjacency_list = build_graph(items, {pid for pid, _ in items})
+    graph = CSRGraph.from_adjacency(adjacency_list, build_reverse_adjacency(adjacency_list, all_ids), all_ids)
+    reference = pagerank_csr(graph, conv_threshold=1e-12)
+    table = LinkTable.from_items(items)
+    chunks = [(table.page_ids[:3], np.diff(table.offsets[:4]), table.targets[: table.offsets[3]]),
+              (table.page_ids[3:], np.diff(table.offsets[3:]), table.targets[table.offsets[3] :])]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EdgeBlockStore.build(Path(tmp), table.page_ids, chunks, block_nodes=2)
+        assert store.num_blocks == 3 and store.num_edges == 10
+        assert store.out_degree.tolist() == graph.out_degree.tolist()
+        assert store.in_degree().tolist() == graph.degrees()[1].tolist()
+        result = pagerank_out_of_core(store, conv_threshold=1e-12)
+        assert result.iterations == reference.iterations
+        assert np.abs(result.ranks - reference.ranks).max() < 1e-15
+
+    # forward push agrees with a dense solve of the personalized system
+    ppr = PersonalizedPageRank(graph)
+    seed = np.zeros(graph.num_nodes)
+    seed[graph.index_of(2)] = 1.0
+    exact = seed.copy()
+    for _ in range(500):
+        exact = 0.15 * seed + 0.85 * graph.in_sums((exact * graph.inv_out_degree)[graph.in_indices])
+    nodes, scores = ppr.scores([2], tol=1e-12)
+    assert np.abs(scores - exact[nodes]).max() < 1e-9
+    top = ppr.top_k([2], k=2, tol=1e-12, exclude_seeds=True)
+    assert [pid for pid, _ in top] == [int(graph.ids[i]) for i in np.argsort(-exact) if graph.ids[i] != 2][:2]
+
+    # the compact graph built from link arrays matches the dict graph (a repeated page's last row wins)
+    compact = CSRGraph.from_links(LinkTable.from_items([(3, [4])] + items), np.array([5, 4, 3, 2, 1, 0]))
+    for name in ("ids", "in_indptr", "in_indices", "out_degree"):
+        assert getattr(compact, name).tolist() == getattr(graph, name).tolist(), name
+    assert compact.out_neighbors(1).tolist() == [2, 2]
+    assert compact.in_neighbors(2).tolist() == [0, 1, 1, 3]
+    assert compact.in_neighbors(5).tolist() == []
+    try:
+        compact.out_neighbors(9)
+        raise AssertionError("expected KeyError")
+    except KeyError:
+        pass
+
+    # the profiler records every stage, and a disabled one records nothing
+    profiler = StageProfiler()
+    with profiler.stage("pagerank") as record:
+        profiler.record_pagerank(record, reference)
+    with StageProfiler(enabled=False).stage("noop") as record:
+        assert record == {}
+    (stage,) = profiler.report()["stages"]
+    assert stage["stage"] == "pagerank" and stage["iterations"] == reference.iterations
+    assert stage["wall_seconds"] >= 0 and stage["peak_bytes"] >= 0
+    assert json.loads(json.dumps(profiler.report()))["stages"][0]["residuals"] == reference.residuals
+
+    # random walks land within a few standard errors of the exact ranks
+    exact = pagerank_csr(graph, conv_threshold=1e-13).ranks
+    estimate = pagerank_monte_carlo(graph, walks_per_node=4000, seed=0)
+    assert estimate.walks == 4000 * graph.num_nodes
+    assert np.all(np.abs(estimate.ranks - exact) <= 5 * estimate.stderr + 1e-12)
+    top, certain = estimate.top_k(1)
+    assert top.tolist() == [int(np.argmax(exact))] and certain == 1
+
+    # every node ordering is a permutation, and PageRank on the relabelled graph maps back exactly
+    for method in REORDERINGS:
+        order = node_order(graph, method)
+        assert sorted(order.tolist()) == list(range(graph.num_nodes)), method
+        relabelled = graph.permuted(order)
+        assert relabelled.index_of(2) == invert_permutation(order)[graph.index_of(2)]
+        assert sorted(relabelled.in_neighbors(2).tolist()) == sorted(graph.in_neighbors(2).tolist())
+        ranks = pagerank_csr(relabelled, conv_threshold=1e-13).ranks[invert_permutation(order)]
+        assert np.abs(ranks - exact).max() < 1e-15, method
+    assert node_order(graph, "degree")[0] == graph.index_of(2)
     print("All tests passed.")
 
 
@@ -120,44 +1823,217 @@ def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--test", action="store_true")
     parser.add_argument("--data-dir", type=Path, default=Path("./web"))
+    parser.add_argument(
+        "--source",
+        default=None,
+        help="Stream pages from gs://BUCKET/PREFIX (or a directory) instead of reading --data-dir",
+    )
+    parser.add_argument("--fetch-concurrency", type=int, default=32, help="Concurrent downloads with --source")
+    parser.add_argument("--ingest", choices=INGEST_MODES, default="process", help="How pages are parsed in parallel")
+    parser.add_argument("--workers", type=int, default=None, help="Parse workers (default: available cores)")
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="Keep the parsed graph in FILE and re-parse only new or modified pages (default: no cache)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Start PageRank from the ranks saved by the previous run (needs the graph cache)",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        help="Run PageRank power iteration across this many processes over shared memory",
+    )
+    parser.add_argument(
+        "--out-of-core",
+        type=Path,
+        default=None,
+        metavar="DIR",
+        help="Write edges to sorted, memory-mapped blocks under DIR and run PageRank from disk",
+    )
+    parser.add_argument("--block-nodes", type=int, default=None, help="Target nodes per out-of-core edge block")
+    parser.add_argument("--solver", choices=PAGERANK_SOLVERS, default="power")
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=GAUSS_SEIDEL_BLOCK_SIZE,
+        help="Rows updated together per in-place step of --solver gauss-seidel",
+    )
+    parser.add_argument("--tol", type=float, default=1e-6, help="PageRank residual tolerance")
+    parser.add_argument("--norm", choices=("l1", "linf"), default="l1", help="PageRank residual norm")
+    parser.add_argument(
+        "--monte-carlo",
+        type=int,
+        default=0,
+        metavar="WALKS",
+        help="Estimate PageRank from WALKS random walks per page instead of iterating (reports stderr)",
+    )
+    parser.add_argument("--top", type=int, default=5, help="How many top pages to print")
+    parser.add_argument(
+        "--reorder",
+        choices=REORDERINGS,
+        default="none",
+        help="Relabel nodes by in-degree, BFS level or community before PageRank for better locality",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each stage (wall and CPU), track its tracemalloc peak and print a report",
+    )
+    parser.add_argument(
+        "--profile-output",
+        type=Path,
+        default=Path("hw2-profile.json"),
+        help="Where --profile writes its JSON report",
+    )
+    parser.add_argument(
+        "--profile-no-memory",
+        action="store_true",
+        help="Skip tracemalloc with --profile (it slows parsing noticeably)",
+    )
+    parser.add_argument("--cprofile", type=Path, default=None, metavar="PATH", help="Dump cProfile stats to PATH")
+    subparsers = parser.add_subparsers(dest="command")
+    query = subparsers.add_parser(
+        "query",
+        help="Personalized PageRank top-k from the graph cache",
+        description="Load the graph cache once and answer personalized PageRank queries. "
+        "With no seeds, reads one whitespace-separated seed set per line from stdin.",
+    )
+    query.add_argument("seeds", type=int, nargs="*", help="Seed page ids")
+    query.add_argument("-k", "--top-k", type=int, default=10)
+    query.add_argument("--push-tol", type=float, default=1e-5, help="Forward-push residual tolerance per out-link")
+    pack = subparsers.add_parser("pack", help="Pack the *.html files of --data-dir into indexed record shards")
+    pack.add_argument("prefix", help="Shards are written as PREFIX-00000.pages, PREFIX-00001.pages, ...")
+    pack.add_argument("--shards", type=int, default=default_workers())
 
     args = parser.parse_args()
+    if args.out_of_core:
+        # the out-of-core path always runs power iteration from disk; refuse options it would ignore
+        ignored = [
+            flag
+            for flag, given in (
+                ("--solver", args.solver != "power"),
+                ("--parallel", args.parallel > 1),
+                ("--incremental", args.incremental),
+                ("--monte-carlo", args.monte_carlo > 0),
+                ("--reorder", args.reorder != "none"),
+                ("--source", bool(args.source)),
+            )
+            if given
+        ]
+        if ignored:
+            parser.error(f"--out-of-core cannot be combined with {', '.join(ignored)}")
+    if args.incremental and not args.cache:
+        parser.error("--incremental needs --cache FILE for the ranks saved by the previous run")
+    if args.command == "query" and not args.cache:
+        parser.error("query needs --cache FILE written by an earlier run")
 
     if args.test:
         run_test()
         return
 
-    data_dir = args.data_dir
-    if not data_dir.is_dir():
-        print(f"Data directory not found: {data_dir}")
+    if args.command == "query":
+        run_queries(args.cache, args.seeds, args.top_k, args.push_tol)
         return
 
-    html_paths = sorted(data_dir.glob("*.html"))
-    if not html_paths:
-        print("No HTML files found.")
-        return
+    profiler = StageProfiler(enabled=args.profile, trace_memory=not args.profile_no_memory)
+    cprofile = cProfile.Profile() if args.cprofile else None
+    if cprofile:
+        cprofile.enable()
+    try:
+        run_from_args(args, profiler)
+    finally:
+        if cprofile:
+            cprofile.disable()
+            cprofile.dump_stats(args.cprofile)
+            print(f"Wrote cProfile stats to {args.cprofile}")
+        if args.profile and profiler.stages:
+            print()
+            profiler.print_table()
+            profiler.write_json(args.profile_output)
+            print(f"Wrote profile to {args.profile_output}")
 
-    print(f"Found {len(html_paths)} HTML files, reading and parsing...")
-    page_ids = {int(p.stem) for p in html_paths}
 
-    def read_and_parse(path: Path) -> tuple[int, list[int]]:
-        html = path.read_text(encoding="utf-8", errors="replace")
-        return (int(path.stem), parse_html_links(html))
+def run_from_args(args: argparse.Namespace, profiler: StageProfiler) -> None:
+    """Ingest the pages named by the parsed command line and run the pipeline."""
+    rank_cache = None
+    if args.source:
+        with profiler.stage("ingest"):
+            table = stream_ingest(open_source(args.source), concurrency=args.fetch_concurrency)
+        if not len(table):
+            print("No HTML files found.")
+            return
+    else:
+        data_dir = args.data_dir
+        if not data_dir.is_dir():
+            print(f"Data directory not found: {data_dir}")
+            return
 
-    items = []
-    with ThreadPoolExecutor(max_workers=16) as executor:
-        futures = {executor.submit(read_and_parse, p): p for p in html_paths}
-        for i, future in enumerate(as_completed(futures), 1):
-            items.append(future.result())
-            if i % 1000 == 0:
-                print(f"  {i}/{len(html_paths)} files")
+        with profiler.stage("discover"):
+            html_paths = sorted(data_dir.glob("*.html"))
+            shard_paths = find_shards(data_dir)
+        if args.command == "pack":
+            written = pack_records(html_paths, args.prefix, args.shards)
+            print(f"Packed {len(html_paths)} pages into {len(written)} record shards")
+            return
+        if not html_paths and not shard_paths:
+            print("No HTML files found.")
+            return
 
-    # Preserve order by page_id so build_graph is deterministic
-    items.sort(key=lambda x: x[0])
+        if args.out_of_core:
+            if shard_paths:
+                print("--out-of-core reads loose *.html files only; ignoring shard archives")
+            print(f"Found {len(html_paths)} HTML files, reading and parsing...")
+            run_out_of_core(
+                html_paths,
+                args.out_of_core,
+                workers=args.workers,
+                block_nodes=args.block_nodes,
+                conv_threshold=args.tol,
+                norm=args.norm,
+                profiler=profiler,
+                top=args.top,
+            )
+            return
 
-    all_ids, adjacency_list = build_graph(items, page_ids)
-    run_pipeline(all_ids, adjacency_list)
+        tables = []
+        with profiler.stage("ingest"):
+            if shard_paths:
+                print(f"Found {len(shard_paths)} shard archives, reading and parsing...")
+                tables.append(ingest_shards(shard_paths, workers=args.workers))
+            if html_paths:
+                print(f"Found {len(html_paths)} HTML files, reading and parsing...")
+                if args.cache:
+                    rank_cache = args.cache.with_name(RANK_CACHE_NAME)
+                    tables.append(ingest_cached(html_paths, args.cache, mode=args.ingest, workers=args.workers))
+                else:
+                    tables.append(ingest_table(html_paths, mode=args.ingest, workers=args.workers))
+            table = LinkTable.concat(tables)
+        if not len(table):
+            print("No HTML files found.")
+            return
 
+    with profiler.stage("build_graph"):
+        graph = CSRGraph.from_links(table)
+    run_pipeline(
+        graph,
+        solver=args.solver,
+        conv_threshold=args.tol,
+        norm=args.norm,
+        rank_cache=rank_cache,
+        incremental=args.incremental,
+        parallel=args.parallel,
+        profiler=profiler,
+        walks_per_node=args.monte_carlo,
+        top=args.top,
+        reorder=args.reorder,
+        block_size=args.block_size,
+    )
 
 if __name__ == "__main__":
     main()
@@ -9,8 +9,10 @@ if [ "$1" = "download" ]; then
   gsutil -m cp -r "gs://${BUCKET}/web/*" "$DATA_DIR/"
 elif [ "$1" = "run" ]; then
   python -u hw2.py --data-dir "$DATA_DIR"
-else
+elif [ "$1" = "all" ]; then
   mkdir -p "$DATA_DIR"
   gsutil -m cp -r "gs://${BUCKET}/web/*" "$DATA_DIR/"
   python -u hw2.py --data-dir "$DATA_DIR"
+else
+  python -u hw2.py --source "gs://${BUCKET}/web/"
 fi
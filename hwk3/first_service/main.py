@@ -2,13 +2,28 @@
 
 import json
 import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from itertools import chain
 
 import functions_framework
+from flask import Response
+from google.api_core.exceptions import NotFound, NotModified, PreconditionFailed, RequestRangeNotSatisfiable
 from google.cloud import storage, pubsub_v1
 
 BUCKET_NAME = os.environ.get("BUCKET", "jweb-content")
 FORBIDDEN_TOPIC = os.environ.get("FORBIDDEN_TOPIC", "jweb-forbidden")
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_MAX_OBJECT_BYTES = int(os.environ.get("CACHE_MAX_OBJECT_BYTES", str(1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", "60"))
+METADATA_CACHE_ENTRIES = int(os.environ.get("METADATA_CACHE_ENTRIES", "10000"))
+STREAM_CHUNK_BYTES = int(os.environ.get("STREAM_CHUNK_BYTES", str(256 * 1024)))
+PUBLISH_MAX_PENDING = int(os.environ.get("PUBLISH_MAX_PENDING", "1000"))
+PUBLISH_MAX_LATENCY_SECONDS = float(os.environ.get("PUBLISH_MAX_LATENCY_SECONDS", "0.05"))
 UNSUPPORTED_METHODS = {"PUT", "POST", "DELETE", "HEAD", "CONNECT", "OPTIONS", "TRACE", "PATCH"}
 
 # US export-restricted countries (sensitive crypto material); normalized lowercase
@@ -32,8 +47,389 @@ def _structured_log(level: str, message: str, **fields) -> None:
     print(message)
 
 
+# Reused across warm invocations of the same instance.
+_storage_client = None
+_bucket = None
+
+
+def _get_bucket() -> storage.Bucket:
+    global _storage_client, _bucket
+    if _bucket is None:
+        _storage_client = storage.Client()
+        _bucket = _storage_client.bucket(BUCKET_NAME)
+    return _bucket
+
+
+@dataclass(frozen=True)
+class _ObjectMetadata:
+    generation: int
+    size: int
+    # Last write time; the generation is an opaque version number, not a date.
+    # A download only reports the generation, so this is None until a lookup.
+    updated: datetime | None
+
+
+@dataclass
+class _CachedObject:
+    content: bytes
+    metadata: _ObjectMetadata
+    fetched_at: float
+
+
+class _ContentCache:
+    """LRU of object bytes bounded by total size; entries older than the TTL are revalidated."""
+
+    def __init__(self, max_bytes: int, max_object_bytes: int, ttl_seconds: float) -> None:
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, _CachedObject] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> _CachedObject | None:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+            return entry
+
+    def is_fresh(self, entry: _CachedObject) -> bool:
+        return time.monotonic() - entry.fetched_at < self.ttl_seconds
+
+    def touch(self, name: str) -> None:
+        """Restart the TTL of an entry GCS confirmed is still current."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.fetched_at = time.monotonic()
+
+    def put(self, name: str, content: bytes, metadata: _ObjectMetadata) -> None:
+        if len(content) > self.max_object_bytes:
+            self.discard(name)
+            return
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None:
+                self._size -= len(old.content)
+            self._entries[name] = _CachedObject(content, metadata, time.monotonic())
+            self._size += len(content)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.content)
+
+    def discard(self, name: str) -> None:
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None:
+                self._size -= len(old.content)
+
+
+class _MetadataCache:
+    """Object name -> last seen ``_ObjectMetadata``, so revalidations and ranges can skip GCS while fresh."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[_ObjectMetadata, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> _ObjectMetadata | None:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or time.monotonic() - entry[1] >= self.ttl_seconds:
+                return None
+            self._entries.move_to_end(name)
+            return entry[0]
+
+    def put(self, name: str, metadata: _ObjectMetadata) -> None:
+        with self._lock:
+            self._entries.pop(name, None)
+            self._entries[name] = (metadata, time.monotonic())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, name: str) -> None:
+        with self._lock:
+            self._entries.pop(name, None)
+
+
+_content_cache = _ContentCache(CACHE_MAX_BYTES, CACHE_MAX_OBJECT_BYTES, CACHE_TTL_SECONDS)
+_metadata_cache = _MetadataCache(METADATA_CACHE_ENTRIES, CACHE_TTL_SECONDS)
+
+
+def _iter_chunks(blob: storage.Blob, start: int, end: int | None, generation: int):
+    """Yield bytes ``start..end`` (inclusive) of one object generation, one ranged read per chunk.
+
+    With ``end`` None, reads continue until a short chunk shows the object has ended.
+    """
+    position = start
+    while end is None or position <= end:
+        chunk_end = position + STREAM_CHUNK_BYTES - 1 if end is None else min(position + STREAM_CHUNK_BYTES - 1, end)
+        try:
+            chunk = blob.download_as_bytes(start=position, end=chunk_end, if_generation_match=generation)
+        except RequestRangeNotSatisfiable:
+            if end is None:
+                # The previous chunk ended exactly at the end of the object.
+                return
+            raise
+        if not chunk:
+            return
+        yield chunk
+        position += len(chunk)
+        if position <= chunk_end:
+            return
+
+
+def _fetch_object(object_name: str):
+    """``(body, generation, write time)`` from the cache or GCS, or None if the object does not exist.
+
+    A miss is a single ranged download of the first chunk (NotFound means
+    404), which also reports the generation; an object that fits in it is
+    complete. The rest of a larger object is read in ranged reads pinned to
+    that generation: up to ``CACHE_MAX_OBJECT_BYTES`` it is assembled and
+    cached, beyond that the chunks read so far and the remaining reads come
+    back as an iterator, so memory stays bounded however large the file. A
+    stale cache entry is revalidated with a conditional first read on its
+    generation, which transfers nothing if the object is unchanged.
+
+    A download does not report the write time, so it is None unless a
+    metadata lookup for a conditional or Range request has filled it in.
+    """
+    cached = _content_cache.get(object_name)
+    if cached is not None and _content_cache.is_fresh(cached):
+        return cached.content, cached.metadata.generation, cached.metadata.updated
+    bucket = _get_bucket()
+    blob = bucket.blob(object_name)
+    conditions = {}
+    if cached is not None:
+        conditions["if_generation_not_match"] = cached.metadata.generation
+    try:
+        head = blob.download_as_bytes(start=0, end=STREAM_CHUNK_BYTES - 1, **conditions)
+    except NotModified:
+        _content_cache.touch(object_name)
+        return cached.content, cached.metadata.generation, cached.metadata.updated
+    except NotFound:
+        _content_cache.discard(object_name)
+        _metadata_cache.discard(object_name)
+        return None
+    except RequestRangeNotSatisfiable:
+        # Empty objects have no byte 0, so the ranged read is refused and only a lookup finds the version.
+        metadata = _lookup_metadata(object_name)
+        if metadata is None:
+            return None
+        _content_cache.put(object_name, b"", metadata)
+        return b"", metadata.generation, metadata.updated
+    generation, updated = blob.generation, blob.updated
+    chunks = [head]
+    if len(head) == STREAM_CHUNK_BYTES:
+        rest = _iter_chunks(blob, len(head), None, generation)
+        size = len(head)
+        for chunk in rest:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > _content_cache.max_object_bytes:
+                _content_cache.discard(object_name)
+                return chain(chunks, rest), generation, updated
+    content = b"".join(chunks)
+    _content_cache.put(object_name, content, _ObjectMetadata(generation, len(content), updated))
+    return content, generation, updated
+
+
+def _object_metadata(object_name: str, need_updated: bool = False) -> _ObjectMetadata | None:
+    """Current metadata of an object from the caches, or a metadata-only GCS lookup.
+
+    A cached page only has the write time if a lookup found it; with
+    ``need_updated`` a page without it is looked up again.
+    """
+    cached = _content_cache.get(object_name)
+    if cached is not None and _content_cache.is_fresh(cached) and not (need_updated and cached.metadata.updated is None):
+        return cached.metadata
+    metadata = _metadata_cache.get(object_name)
+    if metadata is not None:
+        return metadata
+    return _lookup_metadata(object_name)
+
+
+def _lookup_metadata(object_name: str) -> _ObjectMetadata | None:
+    blob = _get_bucket().get_blob(object_name)
+    if blob is None:
+        return None
+    metadata = _ObjectMetadata(blob.generation, blob.size, blob.updated)
+    _metadata_cache.put(object_name, metadata)
+    return metadata
+
+
+def _parse_range(value: str, size: int) -> tuple[int, int] | None:
+    """Inclusive ``(start, end)`` of a single ``bytes=`` range, or None to ignore the header.
+
+    Raises ValueError for a well-formed range that lies outside the object (416).
+    """
+    unit, _, spec = value.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not dash or "," in spec:
+        return None
+    if not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        if int(last) == 0 or size == 0:
+            raise ValueError(f"unsatisfiable range {value!r} for {size} bytes")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(f"unsatisfiable range {value!r} for {size} bytes")
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def _range_response(object_name: str, request_headers):
+    """A 206 or 416 response for a ``Range`` request, or None to send the whole object."""
+    metadata = _object_metadata(object_name)
+    if metadata is None:
+        return None
+    generation, size = metadata.generation, metadata.size
+    # Only a matching strong ETag in If-Range allows a partial response.
+    if_range = request_headers.get("If-Range")
+    if if_range and if_range.strip() != f'"{generation}"':
+        return None
+    try:
+        span = _parse_range(request_headers.get("Range"), size)
+    except ValueError:
+        return "", 416, {"Content-Range": f"bytes */{size}"}
+    if span is None:
+        return None
+    start, end = span
+    headers = {
+        "Content-Type": "text/html",
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1),
+        "Accept-Ranges": "bytes",
+        **_validator_headers(generation, metadata.updated),
+    }
+    cached = _content_cache.get(object_name)
+    if cached is not None and cached.metadata.generation == generation:
+        return cached.content[start : end + 1], 206, headers
+    chunks = _iter_chunks(_get_bucket().blob(object_name), start, end, generation)
+    try:
+        first = next(chunks)
+    except (PreconditionFailed, NotFound):
+        # The cached generation is gone; the full response below looks it up afresh.
+        _metadata_cache.discard(object_name)
+        return None
+    return Response(chain([first], chunks), status=206, headers=headers)
+
+
+def _validator_headers(generation: int, updated: datetime | None) -> dict[str, str]:
+    """ETag and, when the write time is known, Last-Modified for an object version.
+
+    Every write to a GCS object creates a new generation, so the generation
+    identifies the content; the write time comes from the object's metadata.
+    """
+    headers = {"ETag": f'"{generation}"'}
+    if updated is not None:
+        headers["Last-Modified"] = format_datetime(updated, usegmt=True)
+    return headers
+
+
+def _is_not_modified(request_headers, metadata: _ObjectMetadata) -> bool:
+    """Evaluate If-None-Match (which wins when present) or If-Modified-Since against an object version."""
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or f'"{metadata.generation}"' in tags
+    if_modified_since = request_headers.get("If-Modified-Since")
+    if if_modified_since and metadata.updated is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have whole seconds.
+        return int(metadata.updated.timestamp()) <= since.timestamp()
+    return False
+
+
+class _EventPublisher:
+    """Long-lived batching Pub/Sub publisher whose publish() never waits on the network.
+
+    At most ``max_pending`` messages may be unacknowledged; beyond that new
+    events are dropped and counted instead of queuing without bound. Results
+    arrive through done-callbacks, which log failures and keep the counters.
+    """
+
+    def __init__(self, topic: str, max_pending: int, max_latency: float) -> None:
+        self.topic = topic
+        self.max_pending = max_pending
+        self.max_latency = max_latency
+        self._client = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.published = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def _get_client(self) -> pubsub_v1.PublisherClient:
+        if self._client is None:
+            batch_settings = pubsub_v1.types.BatchSettings(
+                max_messages=100,
+                max_bytes=1024 * 1024,
+                max_latency=self.max_latency,
+            )
+            self._client = pubsub_v1.PublisherClient(batch_settings=batch_settings)
+        return self._client
+
+    def counters(self) -> dict[str, int]:
+        with self._lock:
+            return {"pending": self.pending, "published": self.published, "failed": self.failed, "dropped": self.dropped}
+
+    def publish(self, project_id: str, payload: bytes, **fields) -> bool:
+        """Queue ``payload`` for the topic; returns False if it was dropped or rejected."""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                dropped = self.dropped
+            else:
+                self.pending += 1
+                dropped = 0
+        if dropped:
+            # Log the 1st, 2nd, 4th, 8th, ... drop so a burst does not flood the logs.
+            if dropped & (dropped - 1) == 0:
+                _structured_log("WARNING", f"Pub/Sub queue full, dropped {dropped} forbidden events so far", topic=self.topic, **fields)
+            return False
+        try:
+            client = self._get_client()
+            future = client.publish(client.topic_path(project_id, self.topic), payload)
+        except Exception as e:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            _structured_log("ERROR", f"Failed to publish forbidden event: {e}", **fields)
+            return False
+        future.add_done_callback(lambda f: self._on_done(f, fields))
+        return True
+
+    def _on_done(self, future, fields: dict) -> None:
+        try:
+            message_id = future.result()
+        except Exception as e:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            _structured_log("ERROR", f"Failed to publish forbidden event: {e}", **fields)
+            return
+        with self._lock:
+            self.pending -= 1
+            self.published += 1
+        _structured_log("INFO", f"Published forbidden event: message_id={message_id}", topic=self.topic, **fields)
+
+
+_forbidden_publisher = _EventPublisher(FORBIDDEN_TOPIC, PUBLISH_MAX_PENDING, PUBLISH_MAX_LATENCY_SECONDS)
+
+
 def _publish_forbidden_event(country: str, path: str, object_name: str) -> None:
-    """Publish a forbidden-request event to Pub/Sub for the second service."""
+    """Queue a forbidden-request event on Pub/Sub for the second service without waiting for it."""
     project_id = os.environ.get("GOOGLE_CLOUD_PROJECT") or os.environ.get("GCP_PROJECT")
     if not project_id:
         _structured_log("WARNING", "Skipping publish: GOOGLE_CLOUD_PROJECT not set", country=country, path=path)
@@ -44,13 +440,7 @@ def _publish_forbidden_event(country: str, path: str, object_name: str) -> None:
         "object_name": object_name,
         "timestamp": datetime.now(tz=timezone.utc).isoformat(),
     }).encode("utf-8")
-    try:
-        publisher = pubsub_v1.PublisherClient()
-        topic_path = publisher.topic_path(project_id, FORBIDDEN_TOPIC)
-        message_id = publisher.publish(topic_path, payload).result()
-        _structured_log("INFO", f"Published forbidden event: message_id={message_id}", topic=FORBIDDEN_TOPIC, country=country, path=path)
-    except Exception as e:
-        _structured_log("ERROR", f"Failed to publish forbidden event: {e}", country=country, path=path)
+    _forbidden_publisher.publish(project_id, payload, country=country, path=path)
 
 
 @functions_framework.http
@@ -102,11 +492,19 @@ def handler(request):
         )
         return "", 404
 
-    client = storage.Client()
-    bucket = client.bucket(BUCKET_NAME)
-    blob = bucket.blob(object_name)
+    if request.headers.get("If-None-Match") or request.headers.get("If-Modified-Since"):
+        # If-Modified-Since alone needs the write time, which only a lookup reports.
+        metadata = _object_metadata(object_name, need_updated=not request.headers.get("If-None-Match"))
+        if metadata is not None and _is_not_modified(request.headers, metadata):
+            return "", 304, _validator_headers(metadata.generation, metadata.updated)
+
+    if request.headers.get("Range"):
+        response = _range_response(object_name, request.headers)
+        if response is not None:
+            return response
 
-    if not blob.exists():
+    fetched = _fetch_object(object_name)
+    if fetched is None:
         _structured_log(
             "WARNING",
             f"File not found: {object_name}",
@@ -116,7 +514,10 @@ def handler(request):
         )
         return "", 404
 
-    content = blob.download_as_bytes()
-    headers = {"Content-Type": "text/html"}
+    body, generation, updated = fetched
+    headers = {"Content-Type": "text/html", "Accept-Ranges": "bytes", **_validator_headers(generation, updated)}
 
-    return content, 200, headers
+    if isinstance(body, bytes):
+        return body, 200, headers
+    # The size of a streamed object is not known up front, so it is sent chunked.
+    return Response(body, status=200, headers=headers)
@@ -1,14 +1,35 @@
 """
 HW4 first service: HTTP server (stdlib http.server.HTTPServer + BaseHTTPRequestHandler).
 Serves files from GCS; 404/501 -> WARNING; forbidden country -> CRITICAL + Pub/Sub.
+With SERVER_MODE=asyncio the same behaviour is served by an asyncio HTTP/1.1 server
+with keep-alive, running GCS, logging and Pub/Sub calls on a thread pool.
+Hot objects are kept in a local disk cache and served from it with sendfile.
+Pages are sent gzip- or brotli-compressed when the client accepts it (brotli only
+if the optional ``brotli`` package is installed).
 """
 
+import asyncio
+import atexit
+import gzip
+import hashlib
+import http.client
+import io
 import json
 import os
 import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from itertools import chain
+from typing import BinaryIO, Callable, Iterator
 
+from google.api_core.exceptions import NotFound, NotModified, PreconditionFailed, RequestRangeNotSatisfiable
 from google.cloud import storage
 from google.cloud import pubsub_v1
 import google.cloud.logging
@@ -16,6 +37,22 @@ import google.cloud.logging
 BUCKET_NAME = os.environ.get("BUCKET", "jweb-content")
 FORBIDDEN_TOPIC = os.environ.get("FORBIDDEN_TOPIC", "jweb-forbidden")
 PORT = int(os.environ.get("PORT", "8080"))
+SERVER_MODE = os.environ.get("SERVER_MODE", "http")
+ASYNC_WORKERS = int(os.environ.get("ASYNC_WORKERS", "32"))
+KEEPALIVE_TIMEOUT_SECONDS = float(os.environ.get("KEEPALIVE_TIMEOUT_SECONDS", "15"))
+MAX_HEADER_BYTES = 64 * 1024
+MAX_DISCARDED_BODY_BYTES = 1024 * 1024
+METADATA_TTL_SECONDS = float(os.environ.get("METADATA_TTL_SECONDS", "60"))
+METADATA_CACHE_ENTRIES = int(os.environ.get("METADATA_CACHE_ENTRIES", "10000"))
+STREAM_CHUNK_BYTES = int(os.environ.get("STREAM_CHUNK_BYTES", str(256 * 1024)))
+PUBLISH_MAX_PENDING = int(os.environ.get("PUBLISH_MAX_PENDING", "1000"))
+PUBLISH_MAX_LATENCY_SECONDS = float(os.environ.get("PUBLISH_MAX_LATENCY_SECONDS", "0.05"))
+DISK_CACHE_DIR = os.environ.get("DISK_CACHE_DIR", os.path.join(tempfile.gettempdir(), "jweb-file-cache"))
+DISK_CACHE_MAX_BYTES = int(os.environ.get("DISK_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+DISK_CACHE_MAX_OBJECT_BYTES = int(os.environ.get("DISK_CACHE_MAX_OBJECT_BYTES", str(8 * 1024 * 1024)))
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_MAX_OBJECT_BYTES = int(os.environ.get("COMPRESS_MAX_OBJECT_BYTES", str(1024 * 1024)))
+VARIANT_CACHE_MAX_BYTES = int(os.environ.get("VARIANT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
 
 UNSUPPORTED_METHODS = {"PUT", "POST", "DELETE", "HEAD", "CONNECT", "OPTIONS", "TRACE", "PATCH"}
 
@@ -33,13 +70,19 @@ FORBIDDEN_COUNTRIES = {
 
 # Cloud Logging client and logger (initialized on first use)
 _logger = None
+_bucket = None
+# The optional brotli module; False once importing it has failed.
+_brotli = None
+# Guards the lazy globals above against concurrent first requests in asyncio mode.
+_init_lock = threading.Lock()
 
 
 def _get_logger():
     global _logger
-    if _logger is None:
-        client = google.cloud.logging.Client()
-        _logger = client.logger("jweb-file-server")
+    with _init_lock:
+        if _logger is None:
+            client = google.cloud.logging.Client()
+            _logger = client.logger("jweb-file-server")
     return _logger
 
 
@@ -50,6 +93,119 @@ def _log(severity: str, message: str, **fields) -> None:
     print(json.dumps({"severity": severity, **payload}), file=sys.stderr)
 
 
+def _log_quietly(severity: str, message: str, **fields) -> None:
+    """``_log`` for after a response has been sent, where a logging failure must not surface."""
+    try:
+        _log(severity, message, **fields)
+    except Exception:
+        pass
+
+
+def _get_bucket() -> storage.Bucket:
+    global _bucket
+    with _init_lock:
+        if _bucket is None:
+            _bucket = storage.Client().bucket(BUCKET_NAME)
+    return _bucket
+
+
+def _get_brotli():
+    """The ``brotli`` module, imported on first use, or None when it is not installed."""
+    global _brotli
+    with _init_lock:
+        if _brotli is None:
+            try:
+                import brotli
+            except ImportError:
+                brotli = False
+            _brotli = brotli
+    return _brotli or None
+
+
+class EventPublisher:
+    """Long-lived batching Pub/Sub publisher whose publish() never waits on the network.
+
+    At most ``max_pending`` messages may be unacknowledged; beyond that new
+    events are dropped and counted instead of queuing without bound. Results
+    arrive through done-callbacks, which log failures and keep the counters.
+    """
+
+    def __init__(self, topic: str, max_pending: int, max_latency: float) -> None:
+        self.topic = topic
+        self.max_pending = max_pending
+        self.max_latency = max_latency
+        self._client = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.published = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def _get_client(self) -> pubsub_v1.PublisherClient:
+        if self._client is None:
+            batch_settings = pubsub_v1.types.BatchSettings(
+                max_messages=100,
+                max_bytes=1024 * 1024,
+                max_latency=self.max_latency,
+            )
+            self._client = pubsub_v1.PublisherClient(batch_settings=batch_settings)
+        return self._client
+
+    def counters(self) -> dict[str, int]:
+        with self._lock:
+            return {"pending": self.pending, "published": self.published, "failed": self.failed, "dropped": self.dropped}
+
+    def publish(self, project_id: str, payload: bytes, **fields) -> bool:
+        """Queue ``payload`` for the topic; returns False if it was dropped or rejected."""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                dropped = self.dropped
+            else:
+                self.pending += 1
+                dropped = 0
+        if dropped:
+            # Log the 1st, 2nd, 4th, 8th, ... drop so a burst does not flood the logs.
+            if dropped & (dropped - 1) == 0:
+                _log("WARNING", f"Pub/Sub queue full, dropped {dropped} forbidden events so far",
+                     topic=self.topic, **self.counters(), **fields)
+            return False
+        try:
+            client = self._get_client()
+            future = client.publish(client.topic_path(project_id, self.topic), payload)
+        except Exception as e:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            _log("ERROR", f"Failed to publish forbidden event: {e}", **fields)
+            return False
+        future.add_done_callback(lambda f: self._on_done(f, fields))
+        return True
+
+    def _on_done(self, future, fields: dict) -> None:
+        try:
+            future.result()
+        except Exception as e:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            _log("ERROR", f"Failed to publish forbidden event: {e}", **fields)
+            return
+        with self._lock:
+            self.pending -= 1
+            self.published += 1
+
+    def flush(self) -> None:
+        """Send any batched messages now and log the final counters; used at shutdown."""
+        if self._client is not None:
+            self._client.stop()
+        _log_quietly("INFO", "Pub/Sub publisher stopped", topic=self.topic, **self.counters())
+
+
+_forbidden_publisher = EventPublisher(FORBIDDEN_TOPIC, PUBLISH_MAX_PENDING, PUBLISH_MAX_LATENCY_SECONDS)
+atexit.register(_forbidden_publisher.flush)
+
+
 def _publish_forbidden_event(country: str, path: str, object_name: str) -> None:
     project_id = os.environ.get("GOOGLE_CLOUD_PROJECT") or os.environ.get("GCP_PROJECT")
     if not project_id:
@@ -61,93 +217,765 @@ def _publish_forbidden_event(country: str, path: str, object_name: str) -> None:
         "object_name": object_name,
         "timestamp": datetime.now(tz=timezone.utc).isoformat(),
     }).encode("utf-8")
-    try:
-        publisher = pubsub_v1.PublisherClient()
-        topic_path = publisher.topic_path(project_id, FORBIDDEN_TOPIC)
-        publisher.publish(topic_path, payload).result()
-    except Exception as e:
-        _log("ERROR", f"Failed to publish forbidden event: {e}", country=country, path=path)
+    _forbidden_publisher.publish(project_id, payload, country=country, path=path)
 
 
-class GCSFileHandler(BaseHTTPRequestHandler):
-    def _send_error_response(self, code: int, short: str, body: bytes = b"") -> None:
-        """Send a proper HTTP error response (404, 501, etc.) without using send_error()."""
-        self.send_response(code, short)
-        self.send_header("Content-Type", "text/plain")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        if body:
-            self.wfile.write(body)
+@dataclass(frozen=True)
+class ObjectMetadata:
+    """What GCS said about the current version of an object, by a metadata lookup or a full read."""
 
-    def _send_501(self, method: str) -> None:
-        self._send_error_response(501, "Not Implemented", f"Method {method} not implemented".encode())
+    generation: int
+    size: int
+    # Last write time; the generation is an opaque version number, not a date.
+    # A download only reports the generation, so this is None until a lookup.
+    updated: datetime | None
+
+    @classmethod
+    def from_blob(cls, blob: storage.Blob) -> "ObjectMetadata":
+        return cls(blob.generation, blob.size, blob.updated)
+
+
+class MetadataCache:
+    """Object name -> last seen ``ObjectMetadata``, so revalidations and ranges can skip GCS while fresh."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[ObjectMetadata, float]] = OrderedDict()
+        # The asyncio front end looks objects up from several worker threads.
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> ObjectMetadata | None:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or time.monotonic() - entry[1] >= self.ttl_seconds:
+                return None
+            self._entries.move_to_end(name)
+            return entry[0]
+
+    def last_seen(self, name: str) -> ObjectMetadata | None:
+        """The entry for ``name`` even past its TTL, as a guess to revalidate."""
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry[0] if entry is not None else None
+
+    def put(self, name: str, metadata: ObjectMetadata) -> None:
+        with self._lock:
+            self._entries.pop(name, None)
+            self._entries[name] = (metadata, time.monotonic())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, name: str) -> None:
+        with self._lock:
+            self._entries.pop(name, None)
+
+
+_metadata_cache = MetadataCache(METADATA_CACHE_ENTRIES, METADATA_TTL_SECONDS)
+
+
+def _lookup_metadata(bucket: storage.Bucket, object_name: str) -> ObjectMetadata | None:
+    """Current metadata of an object by a metadata-only GCS lookup (None if missing), cached."""
+    blob = bucket.get_blob(object_name)
+    if blob is None:
+        return None
+    metadata = ObjectMetadata.from_blob(blob)
+    _metadata_cache.put(object_name, metadata)
+    return metadata
+
+
+class DiskCache:
+    """Object bodies on local disk, keyed by ``(name, generation)`` and evicted LRU by total bytes.
+
+    A body is written under a temporary name and renamed into place once
+    complete, so readers only ever open whole files. A generation's content
+    never changes, so a cached file stays valid until it is evicted; files of
+    superseded generations are simply never opened again and age out.
+    Complete files left by an earlier run are kept, oldest first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_object_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+
+    def _load(self) -> None:
+        """Create the directory and index what is already in it; called with the lock held."""
+        self._loaded = True
+        if not self.enabled:
+            return
         try:
-            _log("WARNING", f"Request method not implemented: {method}", status=501, method=method)
-        except Exception:
-            pass
+            os.makedirs(self.directory, exist_ok=True)
+            found = []
+            for entry in os.scandir(self.directory):
+                if entry.name.startswith(".fill-"):
+                    os.unlink(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name, stat.st_size))
+        except OSError as e:
+            self.max_bytes = 0
+            _log_quietly("WARNING", f"Disk cache disabled: {e}", directory=self.directory)
+            return
+        for _, filename, size in sorted(found):
+            self._entries[filename] = size
+            self._total_bytes += size
+        self._evict()
 
-    def do_GET(self) -> None:
-        path = (self.path or "").split("?")[0].strip()
-        object_name = path.lstrip("/")
-
-        # X-country: export restriction check
-        x_country = (self.headers.get("X-country") or "").strip().lower()
-        if x_country and x_country in FORBIDDEN_COUNTRIES:
-            obj = object_name or "(root)"
-            self.send_response(400)
-            self.send_header("Content-Type", "text/plain")
-            self.end_headers()
-            self.wfile.write(b"Permission denied")
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._entries:
+            filename, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
             try:
-                _log("CRITICAL", f"Forbidden request from restricted country: {x_country}", status=400, country=x_country, path=path, object_name=obj)
-                _publish_forbidden_event(x_country, path, obj)
-            except Exception:
+                os.unlink(os.path.join(self.directory, filename))
+            except FileNotFoundError:
                 pass
-            return
 
-        if not object_name or ".." in object_name:
-            self._send_error_response(404, "Not Found", b"Not Found")
+    @staticmethod
+    def _filename(name: str, generation: int) -> str:
+        return f"{hashlib.sha256(name.encode()).hexdigest()}-{generation}"
+
+    def has(self, name: str, generation: int) -> bool:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            return self._filename(name, generation) in self._entries
+
+    def open(self, name: str, generation: int) -> BinaryIO | None:
+        """The cached body of one generation opened for reading, or None on a miss."""
+        filename = self._filename(name, generation)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if filename not in self._entries:
+                return None
+            self._entries.move_to_end(filename)
+            # Opened under the lock: eviction may unlink the file afterwards, but not before.
             try:
-                _log("WARNING", f"File not found (invalid path): {path}", status=404, path=path)
-            except Exception:
-                pass
-            return
+                return open(os.path.join(self.directory, filename), "rb")
+            except FileNotFoundError:
+                self._total_bytes -= self._entries.pop(filename)
+                return None
 
+    def fill(self, name: str, generation: int, size: int | None, chunks) -> Iterator[bytes]:
+        """Pass ``chunks`` through while copying them to disk; the entry appears once all ``size`` bytes arrived.
+
+        With ``size`` None the body is complete when ``chunks`` is exhausted,
+        and copying stops if it grows past the size limit.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+        limit = min(self.max_object_bytes, self.max_bytes)
+        if size is not None and (size <= 0 or size > limit):
+            yield from chunks
+            return
         try:
-            client = storage.Client()
-            bucket = client.bucket(BUCKET_NAME)
-            blob = bucket.blob(object_name)
-        except Exception as e:
-            self._send_error_response(500, "Internal Server Error", b"Internal Server Error")
-            try:
-                _log("ERROR", f"GCS error: {e}", path=path, object_name=object_name)
-            except Exception:
-                pass
+            fd, temp_path = tempfile.mkstemp(prefix=".fill-", dir=self.directory)
+        except OSError:
+            yield from chunks
             return
+        file = os.fdopen(fd, "wb")
+        written = 0
+        try:
+            for chunk in chunks:
+                if file is not None:
+                    try:
+                        file.write(chunk)
+                    except OSError:
+                        # Out of disk space and the like: keep serving, stop caching.
+                        file.close()
+                        file = None
+                written += len(chunk)
+                if file is not None and written > limit:
+                    file.close()
+                    file = None
+                yield chunk
+            if file is not None and written > 0 and size in (None, written):
+                file.close()
+                file = None
+                self._commit(temp_path, self._filename(name, generation), written)
+                temp_path = None
+        finally:
+            if file is not None:
+                file.close()
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+
+    def store(self, name: str, generation: int, data: bytes) -> None:
+        for _ in self.fill(name, generation, len(data), [data]):
+            pass
 
-        if not blob.exists():
-            self._send_error_response(404, "Not Found", b"Not Found")
+    def _commit(self, temp_path: str, filename: str, size: int) -> None:
+        with self._lock:
             try:
-                _log("WARNING", f"File not found: {object_name}", status=404, path=path, object_name=object_name)
-            except Exception:
-                pass
+                os.replace(temp_path, os.path.join(self.directory, filename))
+            except OSError:
+                return
+            # Two requests may fill the same generation; the second rename replaces identical bytes.
+            self._total_bytes += size - self._entries.pop(filename, 0)
+            self._entries[filename] = size
+            self._evict()
+
+
+_disk_cache = DiskCache(DISK_CACHE_DIR, DISK_CACHE_MAX_BYTES, DISK_CACHE_MAX_OBJECT_BYTES)
+
+
+class VariantCache:
+    """Compressed bodies keyed by ``(name, generation, encoding)``, evicted LRU by total bytes.
+
+    A generation's content never changes, so an entry needs no revalidation;
+    variants of superseded generations are never asked for again and age out.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[str, int, str], bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, name: str, generation: int, encoding: str) -> bytes | None:
+        key = (name, generation, encoding)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, name: str, generation: int, encoding: str, body: bytes) -> None:
+        key = (name, generation, encoding)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+_variant_cache = VariantCache(VARIANT_CACHE_MAX_BYTES)
+
+
+def _accepted_encoding(request_headers) -> str | None:
+    """The encoding to send: ``br`` or ``gzip``, whichever ``Accept-Encoding`` weights higher (br on a tie), or None."""
+    header = request_headers.get("Accept-Encoding")
+    if not header:
+        return None
+    weights = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        name, _, value = params.strip().partition("=")
+        try:
+            weight = float(value) if name.strip().lower() == "q" else 1.0
+        except ValueError:
+            weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for coding in ("br", "gzip") if _get_brotli() is not None else ("gzip",):
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    # Each variant is compressed once per generation, so use the strongest settings.
+    if encoding == "br":
+        brotli = _get_brotli()
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _iter_chunks(blob: storage.Blob, start: int, end: int | None, generation: int) -> Iterator[bytes]:
+    """Yield bytes ``start..end`` (inclusive) of one object generation, one ranged read per chunk.
+
+    With ``end`` None, reads continue until a short chunk shows the object has ended.
+    """
+    position = start
+    while end is None or position <= end:
+        chunk_end = position + STREAM_CHUNK_BYTES - 1 if end is None else min(position + STREAM_CHUNK_BYTES - 1, end)
+        try:
+            chunk = blob.download_as_bytes(start=position, end=chunk_end, if_generation_match=generation)
+        except RequestRangeNotSatisfiable:
+            if end is None:
+                # The previous chunk ended exactly at the end of the object.
+                return
+            raise
+        if not chunk:
             return
+        yield chunk
+        position += len(chunk)
+        if position <= chunk_end:
+            return
+
+
+def _read_head(blob: storage.Blob, metadata: ObjectMetadata) -> bytes:
+    """The first chunk of one generation; empty objects have no byte 0, so there is nothing to read."""
+    if metadata.size == 0:
+        return b""
+    return blob.download_as_bytes(start=0, end=STREAM_CHUNK_BYTES - 1, if_generation_match=metadata.generation)
+
+
+def _parse_range(value: str, size: int) -> tuple[int, int] | None:
+    """Inclusive ``(start, end)`` of a single ``bytes=`` range, or None to ignore the header.
+
+    Raises ValueError for a well-formed range that lies outside the object (416).
+    """
+    unit, _, spec = value.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not dash or "," in spec:
+        return None
+    if not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        if int(last) == 0 or size == 0:
+            raise ValueError(f"unsatisfiable range {value!r} for {size} bytes")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(f"unsatisfiable range {value!r} for {size} bytes")
+    return start, min(int(last), size - 1) if last else size - 1
 
+
+def _validator_headers(generation: int, updated: datetime | None, encoding: str | None = None) -> dict[str, str]:
+    """ETag, Last-Modified (when the write time is known) and Vary for an object version, sent with ``encoding`` or unencoded.
+
+    Every write to a GCS object creates a new generation, so the generation
+    identifies the content. Each encoding is a different byte sequence, so it
+    gets its own strong ETag.
+    """
+    etag = f'"{generation}-{encoding}"' if encoding else f'"{generation}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if updated is not None:
+        headers["Last-Modified"] = format_datetime(updated, usegmt=True)
+    return headers
+
+
+def _is_not_modified(request_headers, metadata: ObjectMetadata) -> bool:
+    """Evaluate If-None-Match (which wins when present) or If-Modified-Since against an object version."""
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        # Any encoding of the current generation is still valid.
+        return "*" in tags or any(tag.strip('"').split("-")[0] == str(metadata.generation) for tag in tags)
+    if_modified_since = request_headers.get("If-Modified-Since")
+    if if_modified_since and metadata.updated is not None:
         try:
-            content = blob.download_as_bytes()
-        except Exception as e:
-            self._send_error_response(500, "Internal Server Error", b"Internal Server Error")
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have whole seconds.
+        return int(metadata.updated.timestamp()) <= since.timestamp()
+    return False
+
+
+def _needs_metadata(request_headers, metadata: ObjectMetadata | None) -> bool:
+    """Whether answering needs a metadata lookup beyond ``metadata`` (the cached entry, if fresh).
+
+    Range needs the size and the conditional headers the version, which a
+    plain GET learns from its own read; If-Modified-Since alone needs the
+    write time, which only a lookup reports.
+    """
+    conditional = request_headers.get("Range") or request_headers.get("If-None-Match") or request_headers.get("If-Modified-Since")
+    if metadata is None:
+        return bool(conditional)
+    return bool(request_headers.get("If-Modified-Since") and not request_headers.get("If-None-Match") and metadata.updated is None)
+
+
+@dataclass
+class CachedFile:
+    """``count`` bytes of a disk-cached body from ``offset``, sent with sendfile."""
+
+    file: BinaryIO
+    offset: int
+    count: int
+
+
+@dataclass
+class ObjectResponse:
+    status: int
+    reason: str
+    headers: dict[str, str]
+    body: bytes | Iterator[bytes] | CachedFile = b""
+    # Logging and publishing to run once the response has been sent.
+    after: Callable[[], None] | None = None
+
+
+def _error_response(status: int, reason: str, body: bytes, after: Callable[[], None] | None = None) -> ObjectResponse:
+    headers = {"Content-Type": "text/plain", "Content-Length": str(len(body))}
+    return ObjectResponse(status, reason, headers, body, after)
+
+
+def _requested_span(request_headers, generation: int, size: int) -> tuple[int, int] | None:
+    """Inclusive ``(start, end)`` asked for by ``Range``, or None for the whole object.
+
+    Raises ValueError when the range is unsatisfiable.
+    """
+    if not request_headers.get("Range"):
+        return None
+    # Only a matching strong ETag in If-Range allows a partial response.
+    if_range = request_headers.get("If-Range")
+    if if_range and if_range.strip() != f'"{generation}"':
+        return None
+    return _parse_range(request_headers.get("Range"), size)
+
+
+def _unsatisfiable_response(size: int) -> ObjectResponse:
+    return ObjectResponse(416, "Range Not Satisfiable", {"Content-Range": f"bytes */{size}", "Content-Length": "0"})
+
+
+def _cached_response(file: BinaryIO, metadata: ObjectMetadata, request_headers) -> ObjectResponse:
+    """The 200/206/416 response for a body found in the disk cache."""
+    size = metadata.size
+    try:
+        span = _requested_span(request_headers, metadata.generation, size)
+    except ValueError:
+        file.close()
+        return _unsatisfiable_response(size)
+    start, end = span or (0, size - 1)
+    headers = {
+        "Content-Type": "text/html",
+        "Content-Length": str(end - start + 1),
+        "Accept-Ranges": "bytes",
+        **_validator_headers(metadata.generation, metadata.updated),
+    }
+    if span is None:
+        return ObjectResponse(200, "OK", headers, CachedFile(file, 0, size))
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return ObjectResponse(206, "Partial Content", headers, CachedFile(file, start, end - start + 1))
+
+
+def _compressed_response(
+    bucket: storage.Bucket, object_name: str, metadata: ObjectMetadata, encoding: str, data: bytes | None = None
+) -> ObjectResponse | None:
+    """A 200 with the ``encoding`` variant of one generation, or None to send it unencoded.
+
+    ``data`` is the body when the caller has already read it.
+    """
+    generation = metadata.generation
+    body = _variant_cache.get(object_name, generation, encoding)
+    if body is None:
+        cached = _disk_cache.open(object_name, generation) if _disk_cache.enabled and data is None else None
+        if cached is not None:
+            with cached:
+                data = cached.read()
+        elif data is None:
+            try:
+                data = bucket.blob(object_name).download_as_bytes(if_generation_match=generation)
+            except (PreconditionFailed, NotFound):
+                # The cached generation is gone; the unencoded response reads the current one.
+                _metadata_cache.discard(object_name)
+                return None
+            _disk_cache.store(object_name, generation, data)
+        body = _compress(data, encoding)
+        # Kept even when it does not pay off, so the attempt is not repeated.
+        _variant_cache.put(object_name, generation, encoding, body)
+    if len(body) >= metadata.size:
+        return None
+    headers = {
+        "Content-Type": "text/html",
+        "Content-Encoding": encoding,
+        "Content-Length": str(len(body)),
+        **_validator_headers(generation, metadata.updated, encoding),
+    }
+    return ObjectResponse(200, "OK", headers, body)
+
+
+def _range_response(bucket: storage.Bucket, object_name: str, metadata: ObjectMetadata, request_headers) -> ObjectResponse | None:
+    """A 206 or 416 response for a ``Range`` request, or None to send the whole object."""
+    generation, size = metadata.generation, metadata.size
+    try:
+        span = _requested_span(request_headers, generation, size)
+    except ValueError:
+        return _unsatisfiable_response(size)
+    if span is None:
+        return None
+    start, end = span
+    chunks = _iter_chunks(bucket.blob(object_name), start, end, generation)
+    try:
+        first = next(chunks)
+    except (PreconditionFailed, NotFound):
+        # The cached generation is gone; the full response looks it up afresh.
+        _metadata_cache.discard(object_name)
+        return None
+    headers = {
+        "Content-Type": "text/html",
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1),
+        "Accept-Ranges": "bytes",
+        **_validator_headers(generation, metadata.updated),
+    }
+    return ObjectResponse(206, "Partial Content", headers, chain([first], chunks))
+
+
+def _object_response(bucket: storage.Bucket, object_name: str, request_headers) -> ObjectResponse | None:
+    """The 200/206/304/416 response for a GET of ``object_name``, or None if it does not exist.
+
+    A plain GET is a single ranged read of the first ``STREAM_CHUNK_BYTES``,
+    which also reports the generation; the rest of a larger object is
+    streamed in ranged reads pinned to that generation, so memory per request
+    stays at one chunk. The object's metadata (generation, size, write time)
+    is looked up only when a Range or conditional request needs it and
+    nothing is cached, at most once per ``METADATA_TTL_SECONDS``.
+
+    Bodies of up to ``DISK_CACHE_MAX_OBJECT_BYTES`` are copied to the disk
+    cache as they are sent. While the generation is known, later requests are
+    served from that file without touching GCS; once it is not, the first
+    read is made conditional on it, so an unchanged object transfers nothing.
+
+    Objects of ``COMPRESS_MIN_BYTES`` to ``COMPRESS_MAX_OBJECT_BYTES`` are sent
+    compressed when ``Accept-Encoding`` allows, from variants compressed once
+    per generation. Range requests are always answered unencoded.
+    """
+    metadata = _metadata_cache.get(object_name)
+    if _needs_metadata(request_headers, metadata):
+        metadata = _lookup_metadata(bucket, object_name)
+        if metadata is None:
+            return None
+    if metadata is None:
+        return _current_response(bucket, object_name, request_headers)
+    return _known_response(bucket, object_name, metadata, request_headers)
+
+
+def _known_response(bucket: storage.Bucket, object_name: str, metadata: ObjectMetadata, request_headers) -> ObjectResponse | None:
+    """``_object_response`` for a generation believed current, from the caches where possible."""
+    encoding = None if request_headers.get("Range") else _accepted_encoding(request_headers)
+    if not COMPRESS_MIN_BYTES <= metadata.size <= COMPRESS_MAX_OBJECT_BYTES:
+        encoding = None
+    if _is_not_modified(request_headers, metadata):
+        return ObjectResponse(304, "Not Modified", _validator_headers(metadata.generation, metadata.updated, encoding))
+    if encoding is not None:
+        response = _compressed_response(bucket, object_name, metadata, encoding)
+        if response is not None:
+            return response
+
+    cached = _disk_cache.open(object_name, metadata.generation) if _disk_cache.enabled else None
+    if cached is not None:
+        return _cached_response(cached, metadata, request_headers)
+
+    if request_headers.get("Range"):
+        response = _range_response(bucket, object_name, metadata, request_headers)
+        if response is not None:
+            return response
+
+    blob = bucket.blob(object_name)
+    try:
+        head = _read_head(blob, metadata)
+    except (PreconditionFailed, NotFound):
+        # Overwritten or deleted since the metadata was cached; read whatever is there now.
+        _metadata_cache.discard(object_name)
+        return _current_response(bucket, object_name, request_headers)
+    generation, size = metadata.generation, metadata.size
+    body = head
+    if size > len(head):
+        body = chain([head], _iter_chunks(blob, len(head), size - 1, generation))
+    if isinstance(body, bytes):
+        _disk_cache.store(object_name, generation, body)
+    else:
+        body = _disk_cache.fill(object_name, generation, size, body)
+    headers = {
+        "Content-Type": "text/html",
+        "Content-Length": str(size),
+        "Accept-Ranges": "bytes",
+        **_validator_headers(generation, metadata.updated),
+    }
+    return ObjectResponse(200, "OK", headers, body)
+
+
+def _current_response(bucket: storage.Bucket, object_name: str, request_headers) -> ObjectResponse | None:
+    """``_object_response`` for a plain GET when no fresh metadata is cached.
+
+    The first chunk is read unpinned, which also reports the generation. If
+    the disk cache holds the last generation seen, the read is conditional on
+    it having changed, and an unchanged object is served from disk.
+    """
+    blob = bucket.blob(object_name)
+    stale = _metadata_cache.last_seen(object_name)
+    conditions = {}
+    if stale is not None and _disk_cache.enabled and _disk_cache.has(object_name, stale.generation):
+        conditions["if_generation_not_match"] = stale.generation
+    try:
+        head = blob.download_as_bytes(start=0, end=STREAM_CHUNK_BYTES - 1, **conditions)
+    except NotModified:
+        _metadata_cache.put(object_name, stale)
+        return _known_response(bucket, object_name, stale, request_headers)
+    except NotFound:
+        _metadata_cache.discard(object_name)
+        return None
+    except RequestRangeNotSatisfiable:
+        # Empty objects have no byte 0, so the ranged read is refused and only a lookup finds the version.
+        metadata = _lookup_metadata(bucket, object_name)
+        if metadata is None:
+            return None
+        return _known_response(bucket, object_name, metadata, request_headers)
+    generation, updated = blob.generation, blob.updated
+
+    encoding = _accepted_encoding(request_headers)
+    chunks = [head]
+    if len(head) == STREAM_CHUNK_BYTES:
+        rest = _iter_chunks(blob, len(head), None, generation)
+        if encoding is None:
+            return _streamed_response(object_name, generation, updated, chain(chunks, rest))
+        # Read on while the object could still be small enough to compress; past that, stream it.
+        size = len(head)
+        for chunk in rest:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > COMPRESS_MAX_OBJECT_BYTES:
+                return _streamed_response(object_name, generation, updated, chain(chunks, rest))
+
+    data = b"".join(chunks)
+    metadata = ObjectMetadata(generation, len(data), updated)
+    _metadata_cache.put(object_name, metadata)
+    _disk_cache.store(object_name, generation, data)
+    if encoding is not None and COMPRESS_MIN_BYTES <= len(data):
+        response = _compressed_response(bucket, object_name, metadata, encoding, data)
+        if response is not None:
+            return response
+    headers = {
+        "Content-Type": "text/html",
+        "Content-Length": str(len(data)),
+        "Accept-Ranges": "bytes",
+        **_validator_headers(generation, updated),
+    }
+    return ObjectResponse(200, "OK", headers, data)
+
+
+def _streamed_response(object_name: str, generation: int, updated: datetime | None, chunks: Iterator[bytes]) -> ObjectResponse:
+    """A 200 streaming an object whose size is not known up front, so it has no Content-Length.
+
+    The size is counted as the body goes out and cached with the generation
+    once it is complete.
+    """
+
+    def counted() -> Iterator[bytes]:
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        _metadata_cache.put(object_name, ObjectMetadata(generation, size, updated))
+
+    headers = {"Content-Type": "text/html", "Accept-Ranges": "bytes", **_validator_headers(generation, updated)}
+    return ObjectResponse(200, "OK", headers, _disk_cache.fill(object_name, generation, None, counted()))
+
+
+def _not_implemented_response(method: str) -> ObjectResponse:
+    return _error_response(
+        501,
+        "Not Implemented",
+        f"Method {method} not implemented".encode(),
+        lambda: _log_quietly("WARNING", f"Request method not implemented: {method}", status=501, method=method),
+    )
+
+
+def _get_response(path: str, request_headers) -> ObjectResponse:
+    """Decide the response to a GET; shared by the http.server and asyncio front ends. Blocks on GCS."""
+    object_name = path.lstrip("/")
+
+    # X-country: export restriction check
+    x_country = (request_headers.get("X-country") or "").strip().lower()
+    if x_country and x_country in FORBIDDEN_COUNTRIES:
+        obj = object_name or "(root)"
+
+        def report() -> None:
             try:
-                _log("ERROR", f"Failed to download: {e}", path=path, object_name=object_name)
+                _log("CRITICAL", f"Forbidden request from restricted country: {x_country}", status=400, country=x_country, path=path, object_name=obj)
+                _publish_forbidden_event(x_country, path, obj)
             except Exception:
                 pass
-            return
 
-        self.send_response(200)
-        self.send_header("Content-Type", "text/html")
-        self.send_header("Content-Length", str(len(content)))
+        return _error_response(400, "Bad Request", b"Permission denied", report)
+
+    if not object_name or ".." in object_name:
+        return _error_response(
+            404,
+            "Not Found",
+            b"Not Found",
+            lambda: _log_quietly("WARNING", f"File not found (invalid path): {path}", status=404, path=path),
+        )
+
+    try:
+        bucket = _get_bucket()
+    except Exception as e:
+        # ``e`` is unbound once the except block ends, so format the message now.
+        message = f"GCS error: {e}"
+        return _error_response(
+            500,
+            "Internal Server Error",
+            b"Internal Server Error",
+            lambda: _log_quietly("ERROR", message, path=path, object_name=object_name),
+        )
+
+    try:
+        response = _object_response(bucket, object_name, request_headers)
+    except Exception as e:
+        message = f"Failed to download: {e}"
+        return _error_response(
+            500,
+            "Internal Server Error",
+            b"Internal Server Error",
+            lambda: _log_quietly("ERROR", message, path=path, object_name=object_name),
+        )
+
+    if response is None:
+        return _error_response(
+            404,
+            "Not Found",
+            b"Not Found",
+            lambda: _log_quietly("WARNING", f"File not found: {object_name}", status=404, path=path, object_name=object_name),
+        )
+    return response
+
+
+class GCSFileHandler(BaseHTTPRequestHandler):
+    def _send(self, response: ObjectResponse, path: str = "") -> None:
+        self.send_response(response.status, response.reason)
+        for name, value in response.headers.items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(content)
+        if isinstance(response.body, bytes):
+            if response.body:
+                self.wfile.write(response.body)
+        elif isinstance(response.body, CachedFile):
+            # Headers are written straight to the socket, so the file can follow with zero-copy sendfile.
+            with response.body.file as file:
+                try:
+                    self.connection.sendfile(file, response.body.offset, response.body.count)
+                except Exception as e:
+                    _log_quietly("ERROR", f"Failed while sending cached file: {e}", path=path)
+        else:
+            try:
+                for chunk in response.body:
+                    self.wfile.write(chunk)
+            except Exception as e:
+                # Headers are already out; HTTP/1.0 closes the connection, so the client sees a short body.
+                _log_quietly("ERROR", f"Failed while streaming: {e}", path=path)
+        if response.after is not None:
+            response.after()
+
+    def _send_501(self, method: str) -> None:
+        self._send(_not_implemented_response(method))
+
+    def do_GET(self) -> None:
+        path = (self.path or "").split("?")[0].strip()
+        self._send(_get_response(path, self.headers), path)
 
     def do_PUT(self) -> None:
         self._send_501("PUT")
@@ -178,7 +1006,140 @@ class GCSFileHandler(BaseHTTPRequestHandler):
         pass
 
 
+class AsyncFileServer:
+    """HTTP/1.1 front end on asyncio with persistent connections.
+
+    Requests are parsed on the event loop; everything that blocks (GCS reads,
+    Cloud Logging, Pub/Sub) runs on a thread pool, so one slow fetch only
+    holds its own connection. Responses match ``GCSFileHandler``.
+    """
+
+    def __init__(self, workers: int = ASYNC_WORKERS, keepalive_timeout: float = KEEPALIVE_TIMEOUT_SECONDS) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gcs")
+        self.keepalive_timeout = keepalive_timeout
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        async with server:
+            await server.serve_forever()
+
+    async def _blocking(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while await self._handle_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """Serve one request; returns whether the connection stays open."""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keepalive_timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return False
+        except asyncio.LimitOverrunError:
+            await self._write(writer, _error_response(400, "Bad Request", b"Bad Request"), keep_alive=False)
+            return False
+
+        request_line, _, header_block = head.partition(b"\r\n")
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/1."):
+            await self._write(writer, _error_response(400, "Bad Request", b"Bad Request"), keep_alive=False)
+            return False
+        method, target, version = parts
+        headers = http.client.parse_headers(io.BytesIO(header_block))
+
+        connection = (headers.get("Connection") or "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        # Bodies are never used, but must be consumed to find the next request on the connection.
+        if headers.get("Transfer-Encoding"):
+            keep_alive = False
+        else:
+            length = headers.get("Content-Length") or "0"
+            if not length.isdigit():
+                await self._write(writer, _error_response(400, "Bad Request", b"Bad Request"), keep_alive=False)
+                return False
+            if int(length) > MAX_DISCARDED_BODY_BYTES:
+                keep_alive = False
+            elif int(length):
+                await reader.readexactly(int(length))
+
+        if method == "GET":
+            path = target.split("?")[0].strip()
+            response = await self._blocking(_get_response, path, headers)
+        else:
+            path = ""
+            response = _not_implemented_response(method)
+        # A streamed body of unknown length is sent chunked; HTTP/1.0 has no chunking, so there it ends with the connection.
+        chunked = "Content-Length" not in response.headers and not isinstance(response.body, (bytes, CachedFile))
+        if chunked and version != "HTTP/1.1":
+            chunked = keep_alive = False
+        # A HEAD response carries headers only, or the client would misread the next response.
+        sent = await self._write(writer, response, keep_alive, path, send_body=method != "HEAD", chunked=chunked)
+        if response.after is not None:
+            # Fire and forget: logging must not hold up the next request on this connection.
+            asyncio.get_running_loop().run_in_executor(self.executor, response.after)
+        return sent and keep_alive
+
+    async def _write(
+        self,
+        writer: asyncio.StreamWriter,
+        response: ObjectResponse,
+        keep_alive: bool,
+        path: str = "",
+        send_body: bool = True,
+        chunked: bool = False,
+    ) -> bool:
+        """Send a response; returns False if a streamed body failed part way (the connection must close)."""
+        lines = [f"HTTP/1.1 {response.status} {response.reason}", f"Date: {format_datetime(datetime.now(tz=timezone.utc), usegmt=True)}"]
+        lines += [f"{name}: {value}" for name, value in response.headers.items()]
+        if chunked:
+            lines.append("Transfer-Encoding: chunked")
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if isinstance(response.body, CachedFile):
+            with response.body.file as file:
+                await writer.drain()
+                if not send_body:
+                    return True
+                try:
+                    await asyncio.get_running_loop().sendfile(writer.transport, file, response.body.offset, response.body.count)
+                except Exception as e:
+                    self.executor.submit(_log_quietly, "ERROR", f"Failed while sending cached file: {e}", path=path)
+                    return False
+            return True
+        if isinstance(response.body, bytes) or not send_body:
+            if send_body:
+                writer.write(response.body)
+            await writer.drain()
+            return True
+        try:
+            while (chunk := await self._blocking(next, response.body, None)) is not None:
+                if chunked:
+                    # A zero-length chunk would end the body early.
+                    if chunk:
+                        writer.write(b"%x\r\n%b\r\n" % (len(chunk), chunk))
+                else:
+                    writer.write(chunk)
+                await writer.drain()
+        except Exception as e:
+            self.executor.submit(_log_quietly, "ERROR", f"Failed while streaming: {e}", path=path)
+            return False
+        if chunked:
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        return True
+
+
 def main() -> None:
+    if SERVER_MODE == "asyncio":
+        print(f"Serving on 0.0.0.0:{PORT} (asyncio, HTTP/1.1 keep-alive)", file=sys.stderr)
+        asyncio.run(AsyncFileServer().serve("0.0.0.0", PORT))
+        return
     server = HTTPServer(("0.0.0.0", PORT), GCSFileHandler)
     print(f"Serving on 0.0.0.0:{PORT}", file=sys.stderr)
     server.serve_forever()
@@ -20,6 +20,8 @@ export GOOGLE_CLOUD_PROJECT="$PROJECT_ID"
 export BUCKET="jweb-content"
 export FORBIDDEN_TOPIC="jweb-forbidden"
 export PORT="80"
+# "asyncio" serves HTTP/1.1 keep-alive connections concurrently; "http" is the single-threaded http.server.
+export SERVER_MODE="http"
 
 git clone "$GIT_REPO_URL" /tmp/jweb || { echo "Clone failed."; exit 1; }
 cd /tmp/jweb/hwk4/first_service
@@ -1,15 +1,23 @@
 import atexit
+import gzip
+import hashlib
 import json
 import os
 import signal
 import sys
+import tempfile
 import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from time import perf_counter
+from itertools import chain
+from time import monotonic, perf_counter
+from typing import BinaryIO, Iterator
 
 import google.cloud.logging
+from google.api_core.exceptions import NotFound, NotModified, PreconditionFailed, RequestRangeNotSatisfiable
 from google.cloud import pubsub_v1, storage
 from google.cloud.sql.connector import Connector
 import pymysql
@@ -22,6 +30,17 @@ DB_USER = os.environ.get("DB_USER", "")
 DB_PASSWORD = os.environ.get("DB_PASSWORD", "")
 DB_NAME = os.environ.get("DB_NAME", "")
 TIMING_LOG_INTERVAL = int(os.environ.get("TIMING_LOG_INTERVAL", "1000"))
+METADATA_TTL_SECONDS = float(os.environ.get("METADATA_TTL_SECONDS", "60"))
+METADATA_CACHE_ENTRIES = int(os.environ.get("METADATA_CACHE_ENTRIES", "10000"))
+STREAM_CHUNK_BYTES = int(os.environ.get("STREAM_CHUNK_BYTES", str(256 * 1024)))
+PUBLISH_MAX_PENDING = int(os.environ.get("PUBLISH_MAX_PENDING", "1000"))
+PUBLISH_MAX_LATENCY_SECONDS = float(os.environ.get("PUBLISH_MAX_LATENCY_SECONDS", "0.05"))
+DISK_CACHE_DIR = os.environ.get("DISK_CACHE_DIR", os.path.join(tempfile.gettempdir(), "jweb-file-cache"))
+DISK_CACHE_MAX_BYTES = int(os.environ.get("DISK_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+DISK_CACHE_MAX_OBJECT_BYTES = int(os.environ.get("DISK_CACHE_MAX_OBJECT_BYTES", str(8 * 1024 * 1024)))
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_MAX_OBJECT_BYTES = int(os.environ.get("COMPRESS_MAX_OBJECT_BYTES", str(1024 * 1024)))
+VARIANT_CACHE_MAX_BYTES = int(os.environ.get("VARIANT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
 
 UNSUPPORTED_METHODS = {"PUT", "POST", "DELETE", "HEAD", "CONNECT", "OPTIONS", "TRACE", "PATCH"}
 
@@ -39,7 +58,8 @@ FORBIDDEN_COUNTRIES = {
 
 _logger = None
 _storage_client = None
-_publisher = None
+# The optional brotli module; False once importing it has failed.
+_brotli = None
 _connector = None
 
 
@@ -98,6 +118,7 @@ class TimingStats:
             "requests": count,
             "totals": totals,
             "averages": averages,
+            "forbidden_events": FORBIDDEN_EVENTS.counters(),
         }
         print(f"{prefix}: {json.dumps(payload, sort_keys=True)}", file=sys.stderr, flush=True)
 
@@ -105,6 +126,87 @@ class TimingStats:
 TIMING_STATS = TimingStats()
 
 
+class EventPublisher:
+    """Long-lived batching Pub/Sub publisher whose publish() never waits on the network.
+
+    At most ``max_pending`` messages may be unacknowledged; beyond that new
+    events are dropped and counted instead of queuing without bound. Results
+    arrive through done-callbacks, which log failures and keep the counters.
+    """
+
+    def __init__(self, topic: str, max_pending: int, max_latency: float) -> None:
+        self.topic = topic
+        self.max_pending = max_pending
+        self.max_latency = max_latency
+        self._client = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.published = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def _get_client(self) -> pubsub_v1.PublisherClient:
+        if self._client is None:
+            batch_settings = pubsub_v1.types.BatchSettings(
+                max_messages=100,
+                max_bytes=1024 * 1024,
+                max_latency=self.max_latency,
+            )
+            self._client = pubsub_v1.PublisherClient(batch_settings=batch_settings)
+        return self._client
+
+    def counters(self) -> dict[str, int]:
+        with self._lock:
+            return {"pending": self.pending, "published": self.published, "failed": self.failed, "dropped": self.dropped}
+
+    def publish(self, project_id: str, payload: bytes, **fields) -> bool:
+        """Queue ``payload`` for the topic; returns False if it was dropped or rejected."""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                dropped = self.dropped
+            else:
+                self.pending += 1
+                dropped = 0
+        if dropped:
+            # Log the 1st, 2nd, 4th, 8th, ... drop so a burst does not flood the logs.
+            if dropped & (dropped - 1) == 0:
+                _log("WARNING", f"Pub/Sub queue full, dropped {dropped} forbidden events so far", topic=self.topic, **fields)
+            return False
+        try:
+            client = self._get_client()
+            future = client.publish(client.topic_path(project_id, self.topic), payload)
+        except Exception as e:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            _log("ERROR", f"Failed to publish forbidden event: {e}", **fields)
+            return False
+        future.add_done_callback(lambda f: self._on_done(f, fields))
+        return True
+
+    def _on_done(self, future, fields: dict) -> None:
+        try:
+            future.result()
+        except Exception as e:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            _log("ERROR", f"Failed to publish forbidden event: {e}", **fields)
+            return
+        with self._lock:
+            self.pending -= 1
+            self.published += 1
+
+    def flush(self) -> None:
+        """Send any batched messages now; used at shutdown."""
+        if self._client is not None:
+            self._client.stop()
+
+
+FORBIDDEN_EVENTS = EventPublisher(FORBIDDEN_TOPIC, PUBLISH_MAX_PENDING, PUBLISH_MAX_LATENCY_SECONDS)
+
+
 def _handle_exit(signum, frame) -> None:  # type: ignore[no-untyped-def]
     TIMING_STATS.print_summary(prefix=f"timing summary before signal {signum}")
     raise SystemExit(0)
@@ -113,6 +215,7 @@ def _handle_exit(signum, frame) -> None:  # type: ignore[no-untyped-def]
 signal.signal(signal.SIGTERM, _handle_exit)
 signal.signal(signal.SIGINT, _handle_exit)
 atexit.register(TIMING_STATS.print_summary)
+atexit.register(FORBIDDEN_EVENTS.flush)
 
 
 def _get_logger():
@@ -136,11 +239,16 @@ def get_storage_client() -> storage.Client:
     return _storage_client
 
 
-def get_publisher() -> pubsub_v1.PublisherClient:
-    global _publisher
-    if _publisher is None:
-        _publisher = pubsub_v1.PublisherClient()
-    return _publisher
+def get_brotli():
+    """The ``brotli`` module, imported on first use, or None when it is not installed."""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+        except ImportError:
+            brotli = False
+        _brotli = brotli
+    return _brotli or None
 
 
 def get_connector() -> Connector | None:
@@ -203,30 +311,648 @@ def extract_request_metadata(handler: BaseHTTPRequestHandler) -> RequestMetadata
     )
 
 
-def fetch_object_from_gcs(object_name: str) -> tuple[int, bytes, str]:
-    if not object_name or ".." in object_name:
-        return 404, b"Not Found", "text/plain"
+@dataclass(frozen=True)
+class ObjectMetadata:
+    generation: int
+    size: int
+    # Last write time; the generation is an opaque version number, not a date.
+    # A download only reports the generation, so this is None until a lookup.
+    updated: datetime | None
+
+    @classmethod
+    def from_blob(cls, blob: storage.Blob) -> "ObjectMetadata":
+        return cls(blob.generation, blob.size, blob.updated)
+
+
+class MetadataCache:
+    """Object name -> last seen ``ObjectMetadata``, so revalidations and ranges can skip GCS while fresh."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[ObjectMetadata, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> ObjectMetadata | None:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or monotonic() - entry[1] >= self.ttl_seconds:
+                return None
+            self._entries.move_to_end(name)
+            return entry[0]
+
+    def last_seen(self, name: str) -> ObjectMetadata | None:
+        """The entry for ``name`` even past its TTL, as a guess to revalidate."""
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry[0] if entry is not None else None
+
+    def put(self, name: str, metadata: ObjectMetadata) -> None:
+        with self._lock:
+            self._entries.pop(name, None)
+            self._entries[name] = (metadata, monotonic())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, name: str) -> None:
+        with self._lock:
+            self._entries.pop(name, None)
+
+
+METADATA_CACHE = MetadataCache(METADATA_CACHE_ENTRIES, METADATA_TTL_SECONDS)
+
+
+def lookup_object_metadata(object_name: str) -> ObjectMetadata | None:
+    # Metadata-only GCS lookup; a plain GET learns the generation from its own read instead.
+    blob = get_storage_client().bucket(BUCKET_NAME).get_blob(object_name)
+    if blob is None:
+        return None
+    metadata = ObjectMetadata.from_blob(blob)
+    METADATA_CACHE.put(object_name, metadata)
+    return metadata
+
+
+def read_object_head(blob: storage.Blob, metadata: ObjectMetadata) -> bytes:
+    # Empty objects have no byte 0, so there is nothing to read.
+    if metadata.size == 0:
+        return b""
+    return blob.download_as_bytes(start=0, end=STREAM_CHUNK_BYTES - 1, if_generation_match=metadata.generation)
+
+
+class DiskCache:
+    """Object bodies on local disk, keyed by ``(name, generation)`` and evicted LRU by total bytes.
+
+    A body is written under a temporary name and renamed into place once
+    complete, so readers only ever open whole files. A generation's content
+    never changes, so a cached file stays valid until it is evicted; files of
+    superseded generations are simply never opened again and age out.
+    Complete files left by an earlier run are kept, oldest first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_object_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+
+    def _load(self) -> None:
+        """Create the directory and index what is already in it; called with the lock held."""
+        self._loaded = True
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            found = []
+            for entry in os.scandir(self.directory):
+                if entry.name.startswith(".fill-"):
+                    os.unlink(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name, stat.st_size))
+        except OSError as e:
+            self.max_bytes = 0
+            _log("WARNING", f"Disk cache disabled: {e}", directory=self.directory)
+            return
+        for _, filename, size in sorted(found):
+            self._entries[filename] = size
+            self._total_bytes += size
+        self._evict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._entries:
+            filename, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.unlink(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                pass
 
-    bucket = get_storage_client().bucket(BUCKET_NAME)
-    blob = bucket.blob(object_name)
-    if not blob.exists():
-        return 404, b"Not Found", "text/plain"
-    return 200, blob.download_as_bytes(), "text/html"
+    @staticmethod
+    def _filename(name: str, generation: int) -> str:
+        return f"{hashlib.sha256(name.encode()).hexdigest()}-{generation}"
+
+    def has(self, name: str, generation: int) -> bool:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            return self._filename(name, generation) in self._entries
+
+    def open(self, name: str, generation: int) -> BinaryIO | None:
+        """The cached body of one generation opened for reading, or None on a miss."""
+        filename = self._filename(name, generation)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if filename not in self._entries:
+                return None
+            self._entries.move_to_end(filename)
+            # Opened under the lock: eviction may unlink the file afterwards, but not before.
+            try:
+                return open(os.path.join(self.directory, filename), "rb")
+            except FileNotFoundError:
+                self._total_bytes -= self._entries.pop(filename)
+                return None
+
+    def fill(self, name: str, generation: int, size: int | None, chunks) -> Iterator[bytes]:
+        """Pass ``chunks`` through while copying them to disk; the entry appears once all ``size`` bytes arrived.
+
+        With ``size`` None the body is complete when ``chunks`` is exhausted,
+        and copying stops if it grows past the size limit.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+        limit = min(self.max_object_bytes, self.max_bytes)
+        if size is not None and (size <= 0 or size > limit):
+            yield from chunks
+            return
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=".fill-", dir=self.directory)
+        except OSError:
+            yield from chunks
+            return
+        file = os.fdopen(fd, "wb")
+        written = 0
+        try:
+            for chunk in chunks:
+                if file is not None:
+                    try:
+                        file.write(chunk)
+                    except OSError:
+                        # Out of disk space and the like: keep serving, stop caching.
+                        file.close()
+                        file = None
+                written += len(chunk)
+                if file is not None and written > limit:
+                    file.close()
+                    file = None
+                yield chunk
+            if file is not None and written > 0 and size in (None, written):
+                file.close()
+                file = None
+                self._commit(temp_path, self._filename(name, generation), written)
+                temp_path = None
+        finally:
+            if file is not None:
+                file.close()
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+
+    def store(self, name: str, generation: int, data: bytes) -> None:
+        for _ in self.fill(name, generation, len(data), [data]):
+            pass
+
+    def _commit(self, temp_path: str, filename: str, size: int) -> None:
+        with self._lock:
+            try:
+                os.replace(temp_path, os.path.join(self.directory, filename))
+            except OSError:
+                return
+            # Two requests may fill the same generation; the second rename replaces identical bytes.
+            self._total_bytes += size - self._entries.pop(filename, 0)
+            self._entries[filename] = size
+            self._evict()
+
+
+DISK_CACHE = DiskCache(DISK_CACHE_DIR, DISK_CACHE_MAX_BYTES, DISK_CACHE_MAX_OBJECT_BYTES)
+
+
+@dataclass
+class CachedFile:
+    """``count`` bytes of a disk-cached body from ``offset``, sent with sendfile."""
+
+    file: BinaryIO
+    offset: int
+    count: int
+
+
+class VariantCache:
+    """Compressed bodies keyed by ``(name, generation, encoding)``, evicted LRU by total bytes.
+
+    A generation's content never changes, so an entry needs no revalidation;
+    variants of superseded generations are never asked for again and age out.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[str, int, str], bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, name: str, generation: int, encoding: str) -> bytes | None:
+        key = (name, generation, encoding)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, name: str, generation: int, encoding: str, body: bytes) -> None:
+        key = (name, generation, encoding)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+VARIANT_CACHE = VariantCache(VARIANT_CACHE_MAX_BYTES)
+
+
+def accepted_encoding(request_headers) -> str | None:
+    """The encoding to send: ``br`` or ``gzip``, whichever ``Accept-Encoding`` weights higher (br on a tie), or None."""
+    header = request_headers.get("Accept-Encoding")
+    if not header:
+        return None
+    weights = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        name, _, value = params.strip().partition("=")
+        try:
+            weight = float(value) if name.strip().lower() == "q" else 1.0
+        except ValueError:
+            weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for coding in ("br", "gzip") if get_brotli() is not None else ("gzip",):
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    # Each variant is compressed once per generation, so use the strongest settings.
+    if encoding == "br":
+        brotli = get_brotli()
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def iter_object_chunks(blob: storage.Blob, start: int, end: int | None, generation: int) -> Iterator[bytes]:
+    # One ranged read per chunk, pinned to a generation so a concurrent
+    # overwrite fails the read instead of splicing two versions together.
+    # With ``end`` None, reads continue until a short chunk shows the object has ended.
+    position = start
+    while end is None or position <= end:
+        chunk_end = position + STREAM_CHUNK_BYTES - 1 if end is None else min(position + STREAM_CHUNK_BYTES - 1, end)
+        try:
+            chunk = blob.download_as_bytes(start=position, end=chunk_end, if_generation_match=generation)
+        except RequestRangeNotSatisfiable:
+            if end is None:
+                # The previous chunk ended exactly at the end of the object.
+                return
+            raise
+        if not chunk:
+            return
+        yield chunk
+        position += len(chunk)
+        if position <= chunk_end:
+            return
+
+
+def parse_range(value: str, size: int) -> tuple[int, int] | None:
+    """Inclusive ``(start, end)`` of a single ``bytes=`` range, or None to ignore the header.
+
+    Raises ValueError for a well-formed range that lies outside the object (416).
+    """
+    unit, _, spec = value.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not dash or "," in spec:
+        return None
+    if not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        if int(last) == 0 or size == 0:
+            raise ValueError(f"unsatisfiable range {value!r} for {size} bytes")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(f"unsatisfiable range {value!r} for {size} bytes")
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def validator_headers(generation: int, updated: datetime | None, encoding: str | None = None) -> dict[str, str]:
+    # Every write to a GCS object creates a new generation, so the generation
+    # identifies the content. Each encoding is a different byte sequence, so it
+    # gets its own strong ETag. Last-Modified is only sent once a lookup has
+    # found the write time.
+    etag = f'"{generation}-{encoding}"' if encoding else f'"{generation}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if updated is not None:
+        headers["Last-Modified"] = format_datetime(updated, usegmt=True)
+    return headers
+
+
+def is_not_modified(request_headers, metadata: ObjectMetadata) -> bool:
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        # Any encoding of the current generation is still valid.
+        return "*" in tags or any(tag.strip('"').split("-")[0] == str(metadata.generation) for tag in tags)
+    if_modified_since = request_headers.get("If-Modified-Since")
+    if if_modified_since and metadata.updated is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=UTC)
+        # HTTP dates have whole seconds.
+        return int(metadata.updated.timestamp()) <= since.timestamp()
+    return False
+
+
+def needs_object_metadata(request_headers, metadata: ObjectMetadata | None) -> bool:
+    # Range needs the size and the conditional headers the version, which a
+    # plain GET learns from its own read; If-Modified-Since alone needs the
+    # write time, which only a lookup reports.
+    conditional = request_headers.get("Range") or request_headers.get("If-None-Match") or request_headers.get("If-Modified-Since")
+    if metadata is None:
+        return bool(conditional)
+    return bool(request_headers.get("If-Modified-Since") and not request_headers.get("If-None-Match") and metadata.updated is None)
+
+
+def requested_span(request_headers, generation: int, size: int) -> tuple[int, int] | None:
+    """Inclusive ``(start, end)`` asked for by ``Range``, or None for the whole object.
+
+    Raises ValueError when the range is unsatisfiable.
+    """
+    if not request_headers.get("Range"):
+        return None
+    # Only a matching strong ETag in If-Range allows a partial response.
+    if_range = request_headers.get("If-Range")
+    if if_range and if_range.strip() != f'"{generation}"':
+        return None
+    return parse_range(request_headers.get("Range"), size)
+
+
+def cached_object_response(
+    file: BinaryIO, metadata: ObjectMetadata, request_headers
+) -> tuple[int, bytes | CachedFile, str, dict[str, str]]:
+    size = metadata.size
+    try:
+        span = requested_span(request_headers, metadata.generation, size)
+    except ValueError:
+        file.close()
+        return 416, b"", "text/plain", {"Content-Range": f"bytes */{size}"}
+    start, end = span or (0, size - 1)
+    headers = {"Content-Length": str(end - start + 1), "Accept-Ranges": "bytes", **validator_headers(metadata.generation, metadata.updated)}
+    if span is None:
+        return 200, CachedFile(file, 0, size), "text/html", headers
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return 206, CachedFile(file, start, end - start + 1), "text/html", headers
+
+
+def compressed_object_response(
+    object_name: str, metadata: ObjectMetadata, encoding: str, data: bytes | None = None
+) -> tuple[int, bytes, str, dict[str, str]] | None:
+    """A 200 with the ``encoding`` variant of one generation, or None to send it unencoded.
+
+    ``data`` is the body when the caller has already read it.
+    """
+    generation = metadata.generation
+    body = VARIANT_CACHE.get(object_name, generation, encoding)
+    if body is None:
+        cached = DISK_CACHE.open(object_name, generation) if DISK_CACHE.enabled and data is None else None
+        if cached is not None:
+            with cached:
+                data = cached.read()
+        elif data is None:
+            blob = get_storage_client().bucket(BUCKET_NAME).blob(object_name)
+            try:
+                data = blob.download_as_bytes(if_generation_match=generation)
+            except (PreconditionFailed, NotFound):
+                # The cached generation is gone; the unencoded response reads the current one.
+                METADATA_CACHE.discard(object_name)
+                return None
+            DISK_CACHE.store(object_name, generation, data)
+        body = compress_body(data, encoding)
+        # Kept even when it does not pay off, so the attempt is not repeated.
+        VARIANT_CACHE.put(object_name, generation, encoding, body)
+    if len(body) >= metadata.size:
+        return None
+    headers = {"Content-Encoding": encoding, "Content-Length": str(len(body)), **validator_headers(generation, metadata.updated, encoding)}
+    return 200, body, "text/html", headers
+
+
+def fetch_object_range(
+    object_name: str, metadata: ObjectMetadata, request_headers
+) -> tuple[int, bytes | Iterator[bytes], str, dict[str, str]] | None:
+    generation, size = metadata.generation, metadata.size
+    try:
+        span = requested_span(request_headers, generation, size)
+    except ValueError:
+        return 416, b"", "text/plain", {"Content-Range": f"bytes */{size}"}
+    if span is None:
+        return None
+    start, end = span
+    blob = get_storage_client().bucket(BUCKET_NAME).blob(object_name)
+    chunks = iter_object_chunks(blob, start, end, generation)
+    try:
+        first = next(chunks)
+    except (PreconditionFailed, NotFound):
+        # The cached generation is gone; the full response reads the current one.
+        METADATA_CACHE.discard(object_name)
+        return None
+    headers = {
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1),
+        "Accept-Ranges": "bytes",
+        **validator_headers(generation, metadata.updated),
+    }
+    return 206, chain([first], chunks), "text/html", headers
+
+
+def fetch_object_from_gcs(
+    object_name: str, request_headers=None
+) -> tuple[int, bytes | Iterator[bytes] | CachedFile, str, dict[str, str]]:
+    """Status, body, content type and extra headers for a GET of ``object_name``.
+
+    A plain GET is a single ranged read of the first ``STREAM_CHUNK_BYTES``,
+    which also reports the generation; the rest of a larger object comes back
+    as an iterator of ranged reads pinned to that generation, so memory per
+    request stays at one chunk. The object's metadata (generation, size,
+    write time) is looked up only when a Range or conditional request needs
+    it and nothing is cached, at most once per ``METADATA_TTL_SECONDS``.
+
+    Bodies of up to ``DISK_CACHE_MAX_OBJECT_BYTES`` are copied to the disk
+    cache as they are sent; while the generation is known, later requests
+    come back as a ``CachedFile`` without touching GCS, and once it is not,
+    the first read is made conditional on it.
+
+    Objects of ``COMPRESS_MIN_BYTES`` to ``COMPRESS_MAX_OBJECT_BYTES`` are sent
+    compressed when ``Accept-Encoding`` allows, from variants compressed once
+    per generation. Range requests are always answered unencoded.
+    """
+    if not object_name or ".." in object_name:
+        return 404, b"Not Found", "text/plain", {}
+
+    request_headers = request_headers or {}
+    metadata = METADATA_CACHE.get(object_name)
+    if needs_object_metadata(request_headers, metadata):
+        metadata = lookup_object_metadata(object_name)
+        if metadata is None:
+            return 404, b"Not Found", "text/plain", {}
+    if metadata is None:
+        return current_object_response(object_name, request_headers)
+    return known_object_response(object_name, metadata, request_headers)
+
+
+def known_object_response(
+    object_name: str, metadata: ObjectMetadata, request_headers
+) -> tuple[int, bytes | Iterator[bytes] | CachedFile, str, dict[str, str]]:
+    # For a generation believed current, answered from the caches where possible.
+    encoding = None if request_headers.get("Range") else accepted_encoding(request_headers)
+    if not COMPRESS_MIN_BYTES <= metadata.size <= COMPRESS_MAX_OBJECT_BYTES:
+        encoding = None
+    if is_not_modified(request_headers, metadata):
+        return 304, b"", "", validator_headers(metadata.generation, metadata.updated, encoding)
+    if encoding is not None:
+        response = compressed_object_response(object_name, metadata, encoding)
+        if response is not None:
+            return response
+
+    cached = DISK_CACHE.open(object_name, metadata.generation) if DISK_CACHE.enabled else None
+    if cached is not None:
+        return cached_object_response(cached, metadata, request_headers)
+
+    if request_headers.get("Range"):
+        response = fetch_object_range(object_name, metadata, request_headers)
+        if response is not None:
+            return response
+
+    blob = get_storage_client().bucket(BUCKET_NAME).blob(object_name)
+    try:
+        head = read_object_head(blob, metadata)
+    except (PreconditionFailed, NotFound):
+        # Overwritten or deleted since the metadata was cached; read whatever is there now.
+        METADATA_CACHE.discard(object_name)
+        return current_object_response(object_name, request_headers)
+    generation, size = metadata.generation, metadata.size
+    headers = {"Accept-Ranges": "bytes", **validator_headers(generation, metadata.updated)}
+    if size == len(head):
+        DISK_CACHE.store(object_name, generation, head)
+        return 200, head, "text/html", headers
+    headers["Content-Length"] = str(size)
+    chunks = chain([head], iter_object_chunks(blob, len(head), size - 1, generation))
+    return 200, DISK_CACHE.fill(object_name, generation, size, chunks), "text/html", headers
+
+
+def current_object_response(
+    object_name: str, request_headers
+) -> tuple[int, bytes | Iterator[bytes] | CachedFile, str, dict[str, str]]:
+    # A plain GET with no fresh metadata: the first chunk is read unpinned,
+    # which also reports the generation. If the disk cache holds the last
+    # generation seen, the read is conditional on it having changed.
+    blob = get_storage_client().bucket(BUCKET_NAME).blob(object_name)
+    stale = METADATA_CACHE.last_seen(object_name)
+    conditions = {}
+    if stale is not None and DISK_CACHE.enabled and DISK_CACHE.has(object_name, stale.generation):
+        conditions["if_generation_not_match"] = stale.generation
+    try:
+        head = blob.download_as_bytes(start=0, end=STREAM_CHUNK_BYTES - 1, **conditions)
+    except NotModified:
+        METADATA_CACHE.put(object_name, stale)
+        return known_object_response(object_name, stale, request_headers)
+    except NotFound:
+        METADATA_CACHE.discard(object_name)
+        return 404, b"Not Found", "text/plain", {}
+    except RequestRangeNotSatisfiable:
+        # Empty objects have no byte 0, so the ranged read is refused and only a lookup finds the version.
+        metadata = lookup_object_metadata(object_name)
+        if metadata is None:
+            return 404, b"Not Found", "text/plain", {}
+        return known_object_response(object_name, metadata, request_headers)
+    generation, updated = blob.generation, blob.updated
+
+    encoding = accepted_encoding(request_headers)
+    chunks = [head]
+    if len(head) == STREAM_CHUNK_BYTES:
+        rest = iter_object_chunks(blob, len(head), None, generation)
+        if encoding is None:
+            return streamed_object_response(object_name, generation, updated, chain(chunks, rest))
+        # Read on while the object could still be small enough to compress; past that, stream it.
+        size = len(head)
+        for chunk in rest:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > COMPRESS_MAX_OBJECT_BYTES:
+                return streamed_object_response(object_name, generation, updated, chain(chunks, rest))
+
+    data = b"".join(chunks)
+    metadata = ObjectMetadata(generation, len(data), updated)
+    METADATA_CACHE.put(object_name, metadata)
+    DISK_CACHE.store(object_name, generation, data)
+    if encoding is not None and COMPRESS_MIN_BYTES <= len(data):
+        response = compressed_object_response(object_name, metadata, encoding, data)
+        if response is not None:
+            return response
+    return 200, data, "text/html", {"Accept-Ranges": "bytes", **validator_headers(generation, updated)}
+
+
+def streamed_object_response(
+    object_name: str, generation: int, updated: datetime | None, chunks: Iterator[bytes]
+) -> tuple[int, Iterator[bytes], str, dict[str, str]]:
+    # The size is not known up front, so there is no Content-Length and the
+    # body ends when the connection closes. It is counted as it goes out and
+    # cached with the generation once complete.
+    def counted() -> Iterator[bytes]:
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        METADATA_CACHE.put(object_name, ObjectMetadata(generation, size, updated))
+
+    headers = {"Accept-Ranges": "bytes", **validator_headers(generation, updated)}
+    return 200, DISK_CACHE.fill(object_name, generation, None, counted()), "text/html", headers
 
 
 def send_http_response(
     handler: BaseHTTPRequestHandler,
     status_code: int,
-    body: bytes,
+    body: bytes | Iterator[bytes] | CachedFile,
     content_type: str,
     status_text: str,
+    extra_headers: dict[str, str] | None = None,
 ) -> None:
+    extra_headers = extra_headers or {}
     handler.send_response(status_code, status_text)
-    handler.send_header("Content-Type", content_type)
-    handler.send_header("Content-Length", str(len(body)))
+    if status_code != 304:
+        handler.send_header("Content-Type", content_type)
+        # A streamed body of unknown size has none; HTTP/1.0 ends it by closing the connection.
+        if "Content-Length" not in extra_headers and isinstance(body, bytes):
+            handler.send_header("Content-Length", str(len(body)))
+    for name, value in extra_headers.items():
+        handler.send_header(name, value)
     handler.end_headers()
-    if body:
-        handler.wfile.write(body)
+    if isinstance(body, bytes):
+        if body:
+            handler.wfile.write(body)
+        return
+    if isinstance(body, CachedFile):
+        # Headers are written straight to the socket, so the file can follow with zero-copy sendfile.
+        with body.file as file:
+            handler.connection.sendfile(file, body.offset, body.count)
+        return
+    for chunk in body:
+        handler.wfile.write(chunk)
 
 
 def insert_request_log(connection, metadata: RequestMetadata, status_code: int) -> None:
@@ -283,8 +1009,7 @@ def publish_forbidden_event(country: str, path: str, object_name: str) -> None:
             "timestamp": datetime.now(tz=UTC).isoformat(),
         }
     ).encode("utf-8")
-    topic_path = get_publisher().topic_path(project_id, FORBIDDEN_TOPIC)
-    get_publisher().publish(topic_path, payload).result()
+    FORBIDDEN_EVENTS.publish(project_id, payload, country=country, path=path)
 
 
 class GCSFileHandler(BaseHTTPRequestHandler):
@@ -371,20 +1096,33 @@ class GCSFileHandler(BaseHTTPRequestHandler):
 
         gcs_start = perf_counter()
         try:
-            status_code, body, content_type = fetch_object_from_gcs(metadata.requested_file)
-            status_text = "OK" if status_code == 200 else "Not Found"
+            status_code, body, content_type, extra_headers = fetch_object_from_gcs(
+                metadata.requested_file, self.headers
+            )
+            status_text = {
+                200: "OK",
+                206: "Partial Content",
+                304: "Not Modified",
+                416: "Range Not Satisfiable",
+            }.get(status_code, "Not Found")
         except Exception as exc:
-            status_code, body, content_type, status_text = (
+            status_code, body, content_type, status_text, extra_headers = (
                 500,
                 b"Internal Server Error",
                 "text/plain",
                 "Internal Server Error",
+                {},
             )
             _log("ERROR", f"GCS error: {exc}", path=path, object_name=metadata.requested_file)
         TIMING_STATS.record("gcs_read_seconds", perf_counter() - gcs_start)
 
+        # Streamed bodies keep reading from GCS while they are sent, so that time lands here.
         response_start = perf_counter()
-        send_http_response(self, status_code, body, content_type, status_text)
+        try:
+            send_http_response(self, status_code, body, content_type, status_text, extra_headers)
+        except Exception as exc:
+            self.close_connection = True
+            _log("ERROR", f"Failed while streaming: {exc}", path=path, object_name=metadata.requested_file)
         TIMING_STATS.record("response_send_seconds", perf_counter() - response_start)
 
         db_start = perf_counter()
@@ -400,7 +1138,7 @@ class GCSFileHandler(BaseHTTPRequestHandler):
         try:
             connection = get_db_connection()
             insert_request_log(connection, metadata, status_code)
-            if status_code != 200:
+            if status_code not in (200, 206, 304):
                 insert_error_log(connection, metadata, status_code)
         except Exception as exc:
             _log("ERROR", f"Failed to write database rows: {exc}", status=status_code)
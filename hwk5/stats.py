@@ -29,8 +29,8 @@ def main() -> None:
                 "Successful vs unsuccessful requests",
                 """
                 SELECT
-                    SUM(CASE WHEN status_code = 200 THEN 1 ELSE 0 END) AS successful_requests,
-                    SUM(CASE WHEN status_code <> 200 THEN 1 ELSE 0 END) AS unsuccessful_requests
+                    SUM(CASE WHEN status_code IN (200, 206, 304) THEN 1 ELSE 0 END) AS successful_requests,
+                    SUM(CASE WHEN status_code NOT IN (200, 206, 304) THEN 1 ELSE 0 END) AS unsuccessful_requests
                 FROM request_logs
                 """,
             )